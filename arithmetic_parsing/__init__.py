@@ -1,11 +1,44 @@
-from treelib import Tree, Node
+# Annotations are not evaluated, so Tree and Node are only imported
+# for type checkers. treelib is only needed for rendering, so it is
+# imported on first use
+from __future__ import annotations
 from collections import deque
 from . import mathFuncs
-import treelib
-import math
+from .mathFuncs import is_name, to_number
+import importlib
+import sys
 import re
 
-from treelib import tree
+# Type checkers treat this as True. It is not imported from typing,
+# since importing typing takes about a third of the import time budget
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    from treelib import Tree, Node
+
+# Submodules that are only imported when they are first accessed
+# as an attribute of the package (arithmetic_parsing.examples, etc.)
+_lazy_submodules = {
+    "artifact",
+    "backends",
+    "benchmarks",
+    "examples",
+    "formulas",
+    "gradient",
+    "ranges",
+}
+
+def __getattr__(name: str):
+    if name in _lazy_submodules:
+        module = importlib.import_module(f".{name}", __name__)
+        globals()[name] = module
+        return module
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+# Bumped whenever Parser.parse gives different output for the same input,
+# so anything saved from an older parser can be told apart
+# 2: operators of the same priority are grouped from the left
+PARSE_VERSION = 2
 
 
 basicTokens = {
@@ -15,17 +48,110 @@ basicTokens = {
     "/": [2, mathFuncs.div]
 }
 
+# Operators where the order of a and b does not matter
+commutative = {"+", "*"}
+
+def check_namespace(names, namespace: str):
+    """
+        Raises ValueError if any of names looks like a variable that
+        would be created in namespace ({namespace}_0, {namespace}_1, ...),
+        since it would be overwritten
+
+        - names [iterable[str]]
+            Input, formula or variable names
+
+        - namespace [str]
+            The namespace variables are created in
+    """
+    reserved = re.compile(f"{re.escape(namespace)}_\\d+")
+    clashes = sorted(x for x in names if reserved.fullmatch(x))
+    if clashes:
+        raise ValueError(
+            f"{', '.join(clashes)} clash with the variables created in "
+            f"namespace {namespace!r}, use a different namespace"
+        )
+
 def split_keep(s,d):
     split = s.split(d)
     return [substr + d for substr in split[:-1]] + [split[-1]]
 
 
 class ParseResult:
+    """
+        The result of Parser.parse
+
+        Only the tree_list and the infix are kept. The prefix, postfix
+        and tree are worked out from the infix when they are first
+        accessed, and can be dropped again with release()
+    """
+
+    # No __dict__, since thousands of these can be kept around
+    __slots__ = ("tree_list", "infix", "_prefix", "_postfix", "_tree", "_parser", "_output")
+
     tree_list: list[list]
     infix: str
-    prefix: str
-    postfix: str
-    tree: Tree
+
+    def __init__(self):
+        self.tree_list = None
+        self.infix = None
+        self._prefix = None
+        self._postfix = None
+        self._tree = None
+        self._parser = None
+
+        # The operand holding the value, if it is already known.
+        # Bundles set this, so results that optimized down to a
+        # single value do not have to be parsed again
+        self._output = None
+
+    @property
+    def parser(self) -> Parser:
+        """
+            The parser that made this result.
+            Results made by hand use Parser()
+        """
+        if self._parser is None:
+            self._parser = Parser()
+        return self._parser
+
+    @property
+    def prefix(self) -> str:
+        if self._prefix is None:
+            self._prefix = self.parser.infix_to_prefix(self.infix)
+        return self._prefix
+
+    @prefix.setter
+    def prefix(self, value: str):
+        self._prefix = value
+
+    @property
+    def postfix(self) -> str:
+        if self._postfix is None:
+            self._postfix = self.parser.infix_to_postfix(self.infix)
+        return self._postfix
+
+    @postfix.setter
+    def postfix(self, value: str):
+        self._postfix = value
+
+    @property
+    def tree(self) -> Tree:
+        if self._tree is None:
+            self._tree = self.parser.prefix_to_tree(self.prefix)
+        return self._tree
+
+    @tree.setter
+    def tree(self, value: Tree):
+        self._tree = value
+
+    def release(self):
+        """
+            Drops the prefix, postfix and tree.
+            They are worked out again if they are accessed
+        """
+        self._prefix = None
+        self._postfix = None
+        self._tree = None
 
     def __str__(self):
         return self.tree.__str__()
@@ -36,6 +162,43 @@ class ParseResult:
     def as_list(self):
         return self.tree_list
 
+    def instructions(self, namespace: str = "base") -> tuple[list[list], str]:
+        """
+            Returns the dyn instructions, with const declarations replaced
+            by their values, and the operand holding the value of the
+            expression (a variable, an input or a constant)
+
+            - namespace [str] = "base"
+                The namespace for the variables, if the instructions are
+                rebuilt because optimizing removed all of them
+        """
+        source = self.tree_list
+        if not source and self._output is not None:
+            return [], self._output
+        if not source:
+            # Optimizing removes expressions that are a single value
+            # or only constants, so start from the prefix instead
+            prefix = self.prefix.split()
+            if len(prefix) == 1:
+                # A single value is the output, and declaring it could
+                # clash with an input named like the namespace
+                return [], prefix[0]
+            source = self.parser.prefix_to_list(self.prefix, namespace)[0]
+
+        # Variable -> the operand it was declared as
+        aliases: dict[str, str] = {}
+        rows: list[list] = []
+        for expr in source:
+            if expr[0] == "const":
+                aliases[expr[1]] = aliases.get(expr[2], expr[2])
+            else:
+                rows.append(["dyn", expr[1], expr[2], aliases.get(expr[3], expr[3]), aliases.get(expr[4], expr[4])])
+
+        # The output is the variable nothing else uses
+        used = {x for expr in source for x in expr[2:]}
+        output = [expr[1] for expr in source if expr[1] not in used][-1]
+        return rows, aliases.get(output, output)
+
 
 
 class Parser:
@@ -108,6 +271,15 @@ class Parser:
             - expr [str]
                 The input expression
         """
+        return self._infix_to_postfix(expr, True)
+
+    def _infix_to_postfix(self, expr: str, left_associative: bool) -> str:
+        """
+            Converts infix algebra to postfix algebra.
+            If left_associative, operators of the same priority are
+            grouped from the left, so a - b + c is (a - b) + c.
+            This should not be accessed externally
+        """
 
         # The stack that we will be performing operations on
         stack: list[str] = []
@@ -152,8 +324,12 @@ class Parser:
                     # Pop it from the stack while
                     # It's priority is smaller than
                     # the last priority of the stack
+                    # (or the same, if left associative)
                     # Put it into output with a trailing space
-                    while self.get_token_priority(token) <= self.get_token_priority(stack[-1]):
+                    while (
+                        self.get_token_priority(token) < self.get_token_priority(stack[-1])
+                        or (left_associative and self.get_token_priority(token) == self.get_token_priority(stack[-1]))
+                    ):
                         output += f"{stack.pop()} "
                     # And append token to stack
                     stack.append(token)
@@ -185,7 +361,9 @@ class Parser:
         expr = ''.join(expr)
 
         # Convert expr to postfix
-        expr = self.infix_to_postfix(expr)
+        # The expression is reversed, so operators need to be
+        # right associative here to be left associative in the result
+        expr = self._infix_to_postfix(expr, False)
 
         # Reverse expr again
         expr = reversed(expr)
@@ -257,6 +435,9 @@ class Parser:
             - name [str] = "base"
                 The name of the root node of the tree
         """
+        # Import treelib now that we actually need it
+        from treelib import Tree
+
         # Create a tree
         tree = Tree()
 
@@ -295,51 +476,38 @@ class Parser:
         # Return prefix_to_tree of this expr
         return self.prefix_to_tree(prefix, delimeter, node_name)
     
-    def _tree_to_list(self, tree: Tree, node: Node, output: list[list[list]], namespace: str = "namespace"):
-        """
-            Converts a tree to a list.
-            This is for internal use. A Better frontend version
-            will be created later
+    def prefix_to_list(self, expr: str, namespace: str = "base") -> list[list[list]]:
         """
-        # Make sure that the node is from this tree
-        node = tree[node.identifier]
+            Converts whitespace delimeted prefix math to an unoptimized,
+            unsorted tree_list, without building a tree.
 
-        # Get the node's tag
-        tag: str = str(node.tag)
-
-        # If this is the root node
-        if len(tree.children(node.identifier)) == 1:
-            # Calculate A
-            a = tree.children(node.identifier)[0]
-            return self._tree_to_list(tree, a, output, namespace)
-        
-        if node.is_leaf(): # If this node is a leaf
-            # Create the variable
-            vname: str = f"{namespace}_{len(output[1])+1}"
-
-            # Add the variable to the list of variables
-            output[1].append([vname])
+            - expr [str]
+                The input expression
 
-            # And assign the variable as a const
-            output[0].append(["const", vname, tag])
-        else: # If this node is not a leaf
-            # Calculate children
-            children = tree.children(node.identifier)
+            - namespace [str]
+                The namespace to use for creating variables
+        """
+        return self._prefix_to_list(deque(expr.split()), [[],[]], namespace)
 
-            # Get a
-            a = children[0]
+    def _prefix_to_list(self, prefix_deque: deque, output: list[list[list]], namespace: str = "namespace"):
+        """
+            Converts prefix math directly to a list, without building a tree.
+            This should not be accessed externally
+        """
 
-            # Get b
-            b = children[1]
+        # Get the current token by popping the left of the prefix_deque
+        token = prefix_deque.popleft()
 
+        # If the token is an operator
+        if self.is_token(token):
             # Recurse on a
-            output = self._tree_to_list(tree, a, output, namespace)
+            output = self._prefix_to_list(prefix_deque, output, namespace)
 
             # Assign the variable that A created to varA
             varA = output[1][-1][0]
 
             # Recurse on b
-            output = self._tree_to_list(tree, b, output, namespace)
+            output = self._prefix_to_list(prefix_deque, output, namespace)
 
             # Assign the variable that B created to varB
             varB = output[1][-1][0]
@@ -347,16 +515,24 @@ class Parser:
             # Generate the result variable name
             vname: str = f"{namespace}_{len(output[1])+1}"
 
-
             # Set vname to the operation between A and B
-            output[0].append(["dyn", vname, tag, varA, varB])
+            output[0].append(["dyn", vname, token, varA, varB])
 
             # And now append vname to the list of variables
             output[1].append([vname])
-        
+        else:
+            # Create the variable
+            vname: str = f"{namespace}_{len(output[1])+1}"
+
+            # Add the variable to the list of variables
+            output[1].append([vname])
+
+            # And assign the variable as a const
+            output[0].append(["const", vname, token])
+
         # Return output
         return output
-    
+
     def optimize_tree_list(self, tree_list: list[list[list]], namespace: str = "base") -> list[list[list]]:
         """
             Optimizes a tree_list.
@@ -523,6 +699,30 @@ class Parser:
         # Return tree_list
         return tree_list
     
+    def evaluate_list(self, tree_list: list[list], values: dict) -> dict:
+        """
+            Evaluates a tree_list, in order.
+            Returns values, with every variable of the tree_list added
+
+            - tree_list [list[list]]
+                The list to evaluate, like ParseResult.as_list()
+
+            - values [dict]
+                Input name -> value
+        """
+        values = dict(values)
+
+        def resolve(x):
+            return values[x] if is_name(x) else to_number(x)
+
+        for expr in tree_list:
+            if expr[0] == "const":
+                values[expr[1]] = resolve(expr[2])
+            else:
+                values[expr[1]] = self.tokens[expr[2]][1](resolve(expr[3]), resolve(expr[4]))
+
+        return values
+
     def parse(self, expr: str, namespace: str = "base") -> ParseResult:
         """
             Parse the expr to a result
@@ -534,11 +734,12 @@ class Parser:
                 The namespace to use for creating variables
         """
 
-        # Convert infix to tree
-        tree = self.infix_to_tree(expr)
+        # Convert infix to prefix
+        prefix = self.infix_to_prefix(expr)
 
-        # Convert tree to list
-        tree_list = self._tree_to_list(tree, tree[0], [[],[]], namespace)
+        # Convert prefix to list
+        # The tree is only built if the result asks for it
+        tree_list = self.prefix_to_list(prefix, namespace)
 
         if self.optimize:
             # If we should optimize, do that now
@@ -552,18 +753,16 @@ class Parser:
         results = ParseResult()
 
         # Set the tree list
-        results.tree_list = tree_list[0]
+        # Names and constants are interned, so results with the same
+        # variable names (base_0, base_1, ...) share them
+        results.tree_list = [[sys.intern(x) for x in expr] for expr in tree_list[0]]
 
         # Set the infix value
         results.infix = expr
-        
-        # Generate and set the prefix value
-        results.prefix = self.infix_to_prefix(expr)
 
-        # Generate and set the postfix value
-        results.postfix = self.infix_to_postfix(expr)
+        # Keep the parser around so the prefix, postfix
+        # and tree can be worked out later
+        results._parser = self
 
-        # Set the tree value
-        results.tree = tree
         # Return results
         return results
\ No newline at end of file
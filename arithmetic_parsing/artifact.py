@@ -0,0 +1,352 @@
+from . import Parser, ParseResult, PARSE_VERSION
+from .mathFuncs import is_name
+from array import array
+import hashlib
+import struct
+import mmap
+import sys
+
+
+"""
+    Precompiled formula artifacts.
+
+    A bundle stores already optimized and sorted parse results in one
+    binary file, so they can be loaded without tokenizing or running
+    any passes again.
+
+    Layout (all integers are little endian):
+        header        magic, format version, options hash and section sizes
+        symbol table  variable names, operators and formula names
+        constant pool constant operands
+        text table    the infix of every formula
+        formulas      name, infix, output, IR start and IR length
+        IR            4 uint32 per instruction: kind/op, dest, a, b
+
+    An operand with the high bit set is an index into the constant pool,
+    otherwise it is an index into the symbol table. The output of a
+    formula is an operand too, so formulas that optimize down to a single
+    value (2 * 3, or price) have no IR, and are not parsed again.
+"""
+
+MAGIC = b"APIR"
+FORMAT_VERSION = 3
+
+# magic, version, options hash, symbols, constants, text, formulas, IR words
+_header = struct.Struct("<4sH32sIIIII")
+
+# name, infix, output, IR start, IR length
+_formula = struct.Struct("<5I")
+
+# Words per formula in the formula table
+_formula_words = _formula.size // 4
+
+# Flag for operands that live in the constant pool
+_CONST = 1 << 31
+
+# Instruction kinds, stored in the low byte of the first IR word
+_kinds = ["dyn", "const"]
+
+
+def options_hash(parser: Parser) -> bytes:
+    """
+        Hashes everything that changes what Parser.parse outputs,
+        including the version of the parser itself, so artifacts made
+        with different options or an older parser are not mixed up
+
+        - parser [Parser]
+            The parser the artifacts are made with
+    """
+    h = hashlib.sha256()
+    h.update(f"{FORMAT_VERSION}:{PARSE_VERSION}:{parser.optimize}:{parser.sort}".encode())
+    for token, (priority, func) in sorted(parser.tokens.items()):
+        # Functions are identified by name, since they can not be hashed
+        # between processes
+        name = "" if func is None else f"{func.__module__}.{func.__qualname__}"
+        h.update(f"|{token}:{priority}:{name}".encode())
+    return h.digest()
+
+
+class _StringTable:
+    """
+        Deduplicated strings, stored as offsets into one utf-8 blob
+    """
+    def __init__(self):
+        self.index: dict[str, int] = {}
+
+    def add(self, value: str) -> int:
+        value = str(value)
+        if value not in self.index:
+            self.index[value] = len(self.index)
+        return self.index[value]
+
+    def to_bytes(self) -> bytes:
+        encoded = [s.encode() for s in self.index]
+        offsets = array("I", [0])
+        for s in encoded:
+            offsets.append(offsets[-1] + len(s))
+        if sys.byteorder != "little":
+            offsets.byteswap()
+        blob = b"".join(encoded)
+        # Keep every section 4 byte aligned
+        return offsets.tobytes() + blob + b"\0" * (-len(blob) % 4)
+
+
+class _Strings:
+    """
+        A string table written by _StringTable.to_bytes.
+        Strings are only decoded when they are accessed
+    """
+    def __init__(self, data: memoryview, pos: int, count: int):
+        self.offsets = array("I")
+        self.offsets.frombytes(data[pos:pos + (count + 1) * 4])
+        if sys.byteorder != "little":
+            self.offsets.byteswap()
+        pos += (count + 1) * 4
+
+        # Copy the blob, so the data can be closed after loading
+        self.blob = bytes(data[pos:pos + self.offsets[-1]])
+
+        # The position after the table
+        self.end = pos + self.offsets[-1] + (-self.offsets[-1] % 4)
+
+    def __getitem__(self, i: int) -> str:
+        return self.blob[self.offsets[i]:self.offsets[i+1]].decode()
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+
+def dumps(results: dict[str, ParseResult], parser: Parser) -> bytes:
+    """
+        Serializes parse results to a bundle
+
+        - results [dict[str, ParseResult]]
+            Formula name -> result of parser.parse
+
+        - parser [Parser]
+            The parser that made the results
+    """
+    symbols = _StringTable()
+    constants = _StringTable()
+    text = _StringTable()
+
+    # Operators always come first in the symbol table,
+    # so the op index fits in the first IR word
+    ops = [token for token in parser.tokens if parser.tokens[token][1] is not None]
+    for op in ops:
+        symbols.add(op)
+
+    def operand(value) -> int:
+        # Anything that is not a name is a constant
+        value = str(value)
+        if not is_name(value):
+            return constants.add(value) | _CONST
+        return symbols.add(value)
+
+    formulas = array("I")
+    ir = array("I")
+    for name, result in results.items():
+        rows, output = result.instructions()
+        if rows and not result.tree_list:
+            # Optimizing removed every instruction, so only constants
+            # are left. Store their value
+            output = str(parser.evaluate_list(rows, {})[output])
+        start = len(ir) // 4
+        for expr in result.tree_list:
+            kind = _kinds.index(expr[0])
+            if expr[0] == "dyn":
+                ir.extend([
+                    kind | (ops.index(expr[2]) + 1) << 8,
+                    symbols.add(expr[1]),
+                    operand(expr[3]),
+                    operand(expr[4])
+                ])
+            else:
+                ir.extend([kind, symbols.add(expr[1]), operand(expr[2]), 0])
+        formulas.extend([
+            symbols.add(name),
+            text.add(result.infix),
+            operand(output),
+            start,
+            len(ir) // 4 - start
+        ])
+
+    if sys.byteorder != "little":
+        formulas.byteswap()
+        ir.byteswap()
+
+    header = _header.pack(
+        MAGIC, FORMAT_VERSION, options_hash(parser),
+        len(symbols.index), len(constants.index), len(text.index),
+        len(results), len(ir)
+    )
+
+    return b"".join([
+        header + b"\0" * (-len(header) % 4),
+        symbols.to_bytes(),
+        constants.to_bytes(),
+        text.to_bytes(),
+        formulas.tobytes(),
+        ir.tobytes()
+    ])
+
+
+def dump(results: dict[str, ParseResult], parser: Parser, path: str):
+    """
+        Serializes parse results to a bundle file
+
+        - results [dict[str, ParseResult]]
+            Formula name -> result of parser.parse
+
+        - parser [Parser]
+            The parser that made the results
+
+        - path [str]
+            The file to write to
+    """
+    with open(path, "wb") as f:
+        f.write(dumps(results, parser))
+
+
+class FormulaBundle:
+    """
+        A loaded bundle of formulas.
+        Results are only built when they are first accessed,
+        and are then cached
+    """
+
+    def __init__(self, data, parser: Parser = None):
+        """
+            - data [bytes | mmap]
+                The bundle, as written by dumps
+
+            - parser [Parser] = None
+                If given, the bundle must have been made with the same options.
+                This parser is also used to build trees for the results.
+        """
+        with memoryview(data) as view:
+            self._load(view, parser)
+
+        # Formula name -> position in the formula table
+        self._index: dict[str, int] = {
+            self.symbols[self._formulas[i * _formula_words]]: i for i in range(len(self._formulas) // _formula_words)
+        }
+        self._cache: dict[str, ParseResult] = {}
+
+    def _load(self, view: memoryview, parser: Parser):
+        magic, version, digest, n_symbols, n_constants, n_text, n_formulas, n_ir = _header.unpack_from(view, 0)
+        if magic != MAGIC:
+            raise ValueError("not a formula bundle")
+        if version != FORMAT_VERSION:
+            raise ValueError(f"unsupported bundle version {version}, expected {FORMAT_VERSION}")
+        if parser is not None and digest != options_hash(parser):
+            raise ValueError("bundle was made with different parser options")
+
+        self.options_hash: bytes = digest
+        self.parser: Parser = parser if parser is not None else Parser()
+
+        pos = _header.size + (-_header.size % 4)
+        self.symbols = _Strings(view, pos, n_symbols)
+        self.constants = _Strings(view, self.symbols.end, n_constants)
+        self._text = _Strings(view, self.constants.end, n_text)
+        pos = self._text.end
+
+        self._formulas = array("I")
+        self._formulas.frombytes(view[pos:pos + n_formulas * _formula.size])
+        pos += n_formulas * _formula.size
+
+        self._ir = array("I")
+        self._ir.frombytes(view[pos:pos + n_ir * 4])
+
+        if sys.byteorder != "little":
+            self._formulas.byteswap()
+            self._ir.byteswap()
+
+    def _operand(self, value: int) -> str:
+        if value & _CONST:
+            return self.constants[value & ~_CONST]
+        return self.symbols[value]
+
+    def __getitem__(self, name: str) -> ParseResult:
+        if name in self._cache:
+            return self._cache[name]
+
+        i = self._index[name] * _formula_words
+        _, infix, output, start, length = self._formulas[i:i + _formula_words]
+
+        symbols = self.symbols
+        operand = self._operand
+        ir = self._ir
+
+        tree_list = []
+        for i in range(start * 4, (start + length) * 4, 4):
+            kind = ir[i] & 0xFF
+            if _kinds[kind] == "dyn":
+                tree_list.append([
+                    "dyn",
+                    symbols[ir[i+1]],
+                    symbols[(ir[i] >> 8) - 1],
+                    operand(ir[i+2]),
+                    operand(ir[i+3])
+                ])
+            else:
+                tree_list.append(["const", symbols[ir[i+1]], operand(ir[i+2])])
+
+        result = ParseResult()
+        result.tree_list = tree_list
+        # The prefix, postfix and tree are worked out from the infix when used
+        result.infix = self._text[infix]
+        result._output = operand(output)
+        result._parser = self.parser
+
+        self._cache[name] = result
+        return result
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._index
+
+    def __iter__(self):
+        return iter(self._index)
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def keys(self):
+        return self._index.keys()
+
+    def items(self):
+        for name in self._index:
+            yield name, self[name]
+
+
+def loads(data: bytes, parser: Parser = None) -> FormulaBundle:
+    """
+        Loads a bundle from bytes
+
+        - data [bytes]
+            The bundle, as written by dumps
+
+        - parser [Parser] = None
+            If given, the bundle must have been made with the same options
+    """
+    return FormulaBundle(data, parser)
+
+
+def load(path: str, parser: Parser = None) -> FormulaBundle:
+    """
+        Loads a bundle file. The file is mapped into memory, and the
+        sections are copied out of the mapping, so the file is closed
+        again before this returns
+
+        - path [str]
+            The file to load
+
+        - parser [Parser] = None
+            If given, the bundle must have been made with the same options
+    """
+    with open(path, "rb") as f:
+        # Empty files can not be mapped
+        if f.seek(0, 2) == 0:
+            raise ValueError("not a formula bundle")
+        with mmap.mmap(f.fileno(), 0, access = mmap.ACCESS_READ) as data:
+            return FormulaBundle(data, parser)
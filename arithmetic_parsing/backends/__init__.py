@@ -0,0 +1,100 @@
+from arithmetic_parsing import ParseResult
+from arithmetic_parsing.mathFuncs import is_name
+import abc
+
+
+"""
+    Code generation backends.
+
+    A backend takes parse results (the sorted tree_list from Parser.parse)
+    and turns them into something that can run:
+        - assembly: NASM text, from examples.assembly.listToAssembly
+        - c: C source, compiled with the local C compiler and loaded with ctypes
+
+    Backends are looked up by name with get_backend, and new ones can be
+    added with register_backend.
+"""
+
+
+class Backend(abc.ABC):
+    """
+        The base class for backends
+
+        Backends implement emit, which returns the generated source, and
+        can override compile, which by default returns the source
+    """
+    name: str = None
+
+    @abc.abstractmethod
+    def emit(self, results: dict[str, ParseResult]) -> str:
+        """
+            Generates source for a batch of parse results
+
+            - results [dict[str, ParseResult]]
+                Formula name -> result of Parser.parse
+        """
+        raise NotImplementedError
+
+    def compile(self, results):
+        """
+            Compiles one parse result, or a batch of them
+
+            - results [ParseResult | dict[str, ParseResult]]
+                A result, or formula name -> result
+        """
+        return self.emit(as_batch(results))
+
+
+def as_batch(results) -> dict[str, ParseResult]:
+    """
+        Turns a single parse result into a batch of one, named "base"
+    """
+    if isinstance(results, ParseResult):
+        return {"base": results}
+    return results
+
+
+def inputs(rows: list[list], output: str) -> list[str]:
+    """
+        Returns the sorted names of every input the instructions use
+    """
+    defined = {expr[1] for expr in rows}
+    names = {x for expr in rows for x in expr[3:]} | {output}
+    return sorted(x for x in names if is_name(x) and x not in defined)
+
+
+# Backend name -> backend class
+registry: dict[str, type] = {}
+
+def register_backend(backend: type):
+    """
+        Adds a backend class to the registry, under its name
+    """
+    registry[backend.name] = backend
+    return backend
+
+def get_backend(name: str, **options) -> Backend:
+    """
+        Creates a backend by name, passing it options
+    """
+    if name not in registry:
+        raise KeyError(f"unknown backend {name!r}, expected one of {', '.join(sorted(registry))}")
+    return registry[name](**options)
+
+
+from .assembly import AssemblyBackend
+from .c import CBackend, NativeFormulas, CompileError
+
+
+__all__ = [
+    "Backend",
+    "as_batch",
+    "inputs",
+    "registry",
+    "register_backend",
+    "get_backend",
+    "AssemblyBackend",
+    "CBackend",
+    "NativeFormulas",
+    "CompileError",
+]
@@ -0,0 +1,47 @@
+from arithmetic_parsing.backends import Backend, ParseResult, register_backend
+from arithmetic_parsing.mathFuncs import is_name
+
+
+@register_backend
+class AssemblyBackend(Backend):
+    """
+        Emits NASM, using examples.assembly.listToAssembly.
+        Like that function, this is for demonstration purposes
+    """
+    name = "assembly"
+
+    def __init__(self, reg1: str = "rax", reg2: str = "rbx", ranges: dict = None):
+        """
+            - reg1, reg2 [str]
+                The registers to use. The result ends up in reg1
+
+            - ranges [dict[str, RangeAnalysis]] = None
+                Formula name -> ranges.analyze of its tree_list,
+                to narrow registers and division checks
+        """
+        self.reg1 = reg1
+        self.reg2 = reg2
+        self.ranges = ranges or {}
+
+    def lines(self, name: str, result: ParseResult) -> list[str]:
+        """
+            The NASM lines of one formula
+        """
+        # Imported here, since the examples are only loaded when used
+        from arithmetic_parsing.examples.assembly import listToAssembly, resolve_value
+
+        # These are new lists, so listToAssembly can change them
+        rows, output = result.instructions(name)
+
+        if not rows:
+            # The formula is a single input or constant
+            value = resolve_value(output) if is_name(output) else output
+            return [f"mov {self.reg1}, {value} ; for {name} : {result.infix}"]
+
+        return listToAssembly(rows, result.infix, name, self.reg1, self.reg2, self.ranges.get(name))
+
+    def emit(self, results: dict[str, ParseResult]) -> str:
+        out = []
+        for name, result in results.items():
+            out += [f"{name}:"] + self.lines(name, result)
+        return "\n".join(out)
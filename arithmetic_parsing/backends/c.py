@@ -0,0 +1,242 @@
+from arithmetic_parsing.backends import Backend, ParseResult, register_backend, as_batch, inputs
+from arithmetic_parsing.mathFuncs import is_name, to_number
+from array import array
+import subprocess
+import tempfile
+import hashlib
+import ctypes
+import os
+import re
+
+
+"""
+    Compiles formulas to C, and loads them with ctypes.
+
+    Every formula becomes a function that evaluates it over arrays of
+    doubles:
+        void f_<name>(size_t n, const double *const *inputs, double *out)
+    with one input array per variable, in sorted order.
+
+    Compiled libraries are cached on disk, named by a hash of the
+    source and the compiler options, so each batch is only compiled once.
+"""
+
+# Operators that can be written directly in C
+c_operators = {"+", "-", "*", "/"}
+
+# C identifiers, for formula names
+identifier = re.compile(r"[a-zA-Z_][a-zA-Z0-9_]*")
+
+
+class CompileError(RuntimeError):
+    """
+        Raised when the C compiler fails, or can not be found
+    """
+
+
+def default_cache_dir() -> str:
+    """
+        Where compiled libraries are cached, unless told otherwise.
+        $ARITHMETIC_PARSING_CACHE, then $XDG_CACHE_HOME/arithmetic_parsing,
+        then ~/.cache/arithmetic_parsing
+    """
+    if "ARITHMETIC_PARSING_CACHE" in os.environ:
+        return os.environ["ARITHMETIC_PARSING_CACHE"]
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "arithmetic_parsing")
+
+
+def _operand(x: str) -> str:
+    # Variables are prefixed, so they can not clash with C keywords.
+    # Constants are written as doubles, so 1 / 2 is not integer division
+    if is_name(x):
+        return f"v_{x}"
+    return repr(float(to_number(x)))
+
+
+class NativeFormulas:
+    """
+        Formulas loaded from a compiled library
+
+        - inputs [dict[str, list[str]]]
+            Formula name -> the inputs it takes, in order
+    """
+
+    def __init__(self, library: ctypes.CDLL, inputs: dict[str, list[str]], path: str):
+        self.library = library
+        self.inputs = inputs
+        self.path = path
+
+        # Formula name -> C function
+        self.functions = {}
+        for name in inputs:
+            function = getattr(library, f"f_{name}")
+            function.argtypes = [
+                ctypes.c_size_t,
+                ctypes.POINTER(ctypes.POINTER(ctypes.c_double)),
+                ctypes.POINTER(ctypes.c_double)
+            ]
+            function.restype = None
+            self.functions[name] = function
+
+    def evaluate(self, name: str, values: dict) -> array:
+        """
+            Evaluates a formula over arrays
+
+            - name [str]
+                The formula to evaluate
+
+            - values [dict]
+                Input name -> a sequence of values, or a single value
+                that is used for every element.
+                array("d") sequences are used without copying
+
+            Returns an array("d") of results
+        """
+        names = self.inputs[name]
+
+        missing = set(names) - values.keys()
+        if missing:
+            raise KeyError(f"missing inputs: {', '.join(sorted(missing))}")
+
+        # The number of elements is the length of the sequences
+        lengths = {len(values[x]) for x in names if not isinstance(values[x], (int, float))}
+        if len(lengths) > 1:
+            raise ValueError("inputs have different lengths")
+        n = lengths.pop() if lengths else 1
+
+        buffers = []
+        for x in names:
+            value = values[x]
+            if isinstance(value, (int, float)):
+                buffers.append(array("d", [value]) * n)
+            elif isinstance(value, array) and value.typecode == "d":
+                buffers.append(value)
+            else:
+                buffers.append(array("d", value))
+
+        out = array("d", bytes(8 * n))
+
+        def pointer(buffer: array):
+            address, _ = buffer.buffer_info()
+            return ctypes.cast(address, ctypes.POINTER(ctypes.c_double))
+
+        pointers = (ctypes.POINTER(ctypes.c_double) * max(1, len(buffers)))(*[pointer(b) for b in buffers])
+        self.functions[name](n, pointers, pointer(out))
+        return out
+
+    def __call__(self, name: str, **values) -> float:
+        """
+            Evaluates a formula once, with single values
+        """
+        return self.evaluate(name, values)[0]
+
+
+@register_backend
+class CBackend(Backend):
+    """
+        Emits C, compiles it with the local C compiler,
+        and loads it with ctypes
+    """
+    name = "c"
+
+    def __init__(self, cc: str = None, flags: list[str] = None, cache_dir: str = None):
+        """
+            - cc [str] = None
+                The C compiler. Defaults to $CC, or cc
+
+            - flags [list[str]] = None
+                Compiler flags. Defaults to -O2
+
+            - cache_dir [str] = None
+                Where compiled libraries are kept. Defaults to default_cache_dir()
+        """
+        self.cc = cc or os.environ.get("CC", "cc")
+        self.flags = flags if flags is not None else ["-O2"]
+        self.cache_dir = cache_dir or default_cache_dir()
+
+    def function(self, name: str, result: ParseResult) -> tuple[str, list[str]]:
+        """
+            The C function for one formula, and the inputs it takes
+        """
+        if not identifier.fullmatch(name):
+            raise ValueError(f"formula name {name!r} is not a valid identifier")
+
+        rows, output = result.instructions()
+        names = inputs(rows, output)
+
+        lines = [
+            f"void f_{name}(size_t n, const double *const *inputs, double *out) {{",
+            "    for (size_t i = 0; i < n; i++) {"
+        ]
+        for j, x in enumerate(names):
+            lines.append(f"        const double v_{x} = inputs[{j}][i];")
+        for _, vname, op, a, b in rows:
+            if op not in c_operators:
+                raise ValueError(f"the C backend does not support operator {op!r}")
+            lines.append(f"        const double v_{vname} = {_operand(a)} {op} {_operand(b)};")
+        lines += [
+            f"        out[i] = {_operand(output)};",
+            "    }",
+            "}"
+        ]
+        return "\n".join(lines), names
+
+    def _source(self, results: dict[str, ParseResult]) -> tuple[str, dict[str, list[str]]]:
+        """
+            The C source for a batch, and the inputs of each formula
+        """
+        functions = ["#include <stddef.h>"]
+        names: dict[str, list[str]] = {}
+        for name, result in results.items():
+            function, names[name] = self.function(name, result)
+            functions.append(function)
+        return "\n\n".join(functions) + "\n", names
+
+    def emit(self, results: dict[str, ParseResult]) -> str:
+        return self._source(results)[0]
+
+    def compile(self, results) -> NativeFormulas:
+        """
+            Compiles one parse result, or a batch of them, and loads them.
+            A single result is named "base"
+        """
+        results = as_batch(results)
+
+        source, names = self._source(results)
+
+        # The cache key covers everything that changes the library
+        key = hashlib.sha256("\0".join([source, self.cc, *self.flags]).encode()).hexdigest()
+        path = os.path.join(self.cache_dir, f"{key}.so")
+
+        if not os.path.exists(path):
+            self._build(source, path)
+
+        return NativeFormulas(ctypes.CDLL(path), names, path)
+
+    def _build(self, source: str, path: str):
+        """
+            Compiles source to a shared library at path
+        """
+        os.makedirs(self.cache_dir, exist_ok = True)
+
+        with tempfile.TemporaryDirectory(dir = self.cache_dir) as build:
+            c_path = os.path.join(build, "formulas.c")
+            so_path = os.path.join(build, "formulas.so")
+            with open(c_path, "w") as f:
+                f.write(source)
+
+            try:
+                subprocess.run(
+                    [self.cc, *self.flags, "-shared", "-fPIC", "-o", so_path, c_path],
+                    capture_output = True,
+                    text = True,
+                    check = True
+                )
+            except FileNotFoundError:
+                raise CompileError(f"C compiler {self.cc!r} not found")
+            except subprocess.CalledProcessError as e:
+                raise CompileError(f"{self.cc} failed:\n{e.stderr}")
+
+            # Rename into place, so other processes never see half a library
+            os.replace(so_path, path)
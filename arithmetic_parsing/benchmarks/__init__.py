@@ -0,0 +1,5 @@
+"""
+    Benchmarks, budget checks and fuzzing for arithmetic_parsing.
+    Each one can be run as a module, for example:
+        python -m arithmetic_parsing.benchmarks.startup
+"""
@@ -0,0 +1,449 @@
+from arithmetic_parsing import Parser, ParseResult, basicTokens
+from arithmetic_parsing.mathFuncs import is_name, to_number
+from concurrent.futures import ProcessPoolExecutor
+import importlib
+import argparse
+import random
+import math
+import time
+import sys
+import os
+
+
+"""
+    Differential fuzzing of every way of evaluating an expression.
+
+    Random expressions are generated from the operators in Parser.tokens,
+    evaluated directly as a reference, then parsed and evaluated through
+    each path (the tree, the folded list, the sorted list, ...). Any
+    disagreement is shrunk to a small expression that still disagrees.
+
+    Run with:
+        python -m arithmetic_parsing.benchmarks.fuzz --count 10000
+"""
+
+# Names used for variables in generated expressions
+default_names = ["a", "b", "c", "d"]
+
+
+def operators(tokens: dict) -> list[str]:
+    """
+        The binary operators in a token table (everything with a function)
+    """
+    return [token for token in tokens if tokens[token][1] is not None]
+
+
+def random_tree(rng: random.Random, ops: list[str], size: int, depth: int, names: list[str] = default_names):
+    """
+        Creates a random expression tree, with exactly size operators
+        and at most depth levels of them.
+
+        Leaves are strings, and operators are (op, a, b) tuples
+    """
+    # Expressions can not have more operators than fit in depth levels
+    size = min(size, 2 ** depth - 1)
+
+    if size == 0:
+        if rng.random() < 0.5:
+            return rng.choice(names)
+        return str(rng.randint(0, 9))
+
+    # Split the other operators between a and b,
+    # so that both of them fit in depth - 1 levels
+    capacity = 2 ** (depth - 1) - 1
+    left = rng.randint(max(0, size - 1 - capacity), min(size - 1, capacity))
+
+    return (
+        rng.choice(ops),
+        random_tree(rng, ops, left, depth - 1, names),
+        random_tree(rng, ops, size - 1 - left, depth - 1, names)
+    )
+
+
+def render(node, tokens: dict = basicTokens, rng: random.Random = None, extra_parens: float = 0.0) -> str:
+    """
+        Converts an expression tree to infix, only adding the parentheses
+        that are needed (operators are left associative), plus some
+        random extra ones if extra_parens is above 0
+    """
+    if isinstance(node, str):
+        return node
+
+    op, a, b = node
+    priority = tokens[op][0]
+
+    def wrap(child, right: bool) -> str:
+        text = render(child, tokens, rng, extra_parens)
+        if isinstance(child, str):
+            return text
+        child_priority = tokens[child[0]][0]
+        needed = child_priority < priority or (right and child_priority == priority)
+        if needed or (rng is not None and rng.random() < extra_parens):
+            return f"({text})"
+        return text
+
+    return f"{wrap(a, False)} {op} {wrap(b, True)}"
+
+
+def reference(node, values: dict, tokens: dict = basicTokens):
+    """
+        Evaluates an expression tree directly
+    """
+    if isinstance(node, str):
+        return values[node] if is_name(node) else to_number(node)
+    op, a, b = node
+    return tokens[op][1](reference(a, values, tokens), reference(b, values, tokens))
+
+
+def finite_difference(node, values: dict, name: str, tokens: dict = basicTokens, step: float = 1e-6) -> float:
+    """
+        The derivative of an expression tree with respect to one variable,
+        from a central finite difference of reference
+    """
+    h = step * max(1.0, abs(values[name]))
+    up = dict(values)
+    up[name] = values[name] + h
+    down = dict(values)
+    down[name] = values[name] - h
+    return (reference(node, up, tokens) - reference(node, down, tokens)) / (2 * h)
+
+
+def check_derivatives(node, values: dict, tokens: dict = basicTokens) -> list[str]:
+    """
+        Checks every derivative from differentiate against a finite
+        difference. Returns a list of disagreements
+    """
+    from arithmetic_parsing.gradient import differentiate
+    infix = render(node, tokens)
+    value, derivatives = differentiate(Parser(tokens = tokens).parse(infix), list(values)).evaluate(values)
+
+    problems: list[str] = []
+    for name, derivative in derivatives.items():
+        try:
+            expected = finite_difference(node, values, name, tokens)
+        except ZeroDivisionError:
+            # A step crossed a division by zero
+            continue
+        # Rounding in the finite difference grows with the size of the value
+        h = 1e-6 * max(1.0, abs(values[name]))
+        if not math.isclose(derivative, expected, rel_tol = 1e-5, abs_tol = 1e-12 * (1 + abs(value)) / h):
+            problems.append(f"gradient: d/d{name} of {infix} gave {derivative}, expected about {expected}")
+    return problems
+
+
+def _list_value(result: ParseResult, values: dict, parser: Parser):
+    """
+        Evaluates the instructions of a result, and returns its value
+    """
+    rows, output = result.instructions()
+    values = parser.evaluate_list(rows, values)
+    return values[output] if is_name(output) else to_number(output)
+
+
+def _tree_value(tree, node, values: dict, parser: Parser):
+    """
+        Evaluates a treelib tree from the node down
+    """
+    children = tree.children(node.identifier)
+    if len(children) == 1:
+        # The root node
+        return _tree_value(tree, children[0], values, parser)
+    tag = str(node.tag)
+    if not children:
+        return values[tag] if is_name(tag) else to_number(tag)
+    a = _tree_value(tree, children[0], values, parser)
+    b = _tree_value(tree, children[1], values, parser)
+    return parser.tokens[tag][1](a, b)
+
+
+def _emulate(asm: list[str], values: dict) -> dict:
+    """
+        Runs the NASM made by listToAssembly, with integer registers.
+        Returns the registers
+    """
+    registers: dict[str, int] = {}
+
+    def read(x: str) -> int:
+        if x.startswith("["):
+            return values[x[1:-1]]
+        if x in registers:
+            return registers[x]
+        return int(x)
+
+    for line in asm:
+        line = line.split(";")[0]
+        instruction, _, operands = line.strip().partition(" ")
+        if instruction in ["cmp", "je"]:
+            continue
+        dest, src = [x.strip() for x in operands.split(",")]
+        if instruction == "mov":
+            registers[dest] = read(src)
+        elif instruction == "add":
+            registers[dest] += read(src)
+        elif instruction == "sub":
+            registers[dest] -= read(src)
+        elif instruction == "imul":
+            registers[dest] *= read(src)
+        elif instruction == "idiv":
+            registers[dest] = int(registers[dest] / read(src))
+        else:
+            raise ValueError(f"can not emulate {line!r}")
+    return registers
+
+
+# Every path, by name. Each one takes the tokens, the infix and
+# the values of the variables, and returns the value of the expression,
+# or None if the path can not work out a value for this expression
+
+def path_tree(tokens: dict, infix: str, values: dict):
+    parser = Parser(tokens = tokens)
+    tree = parser.infix_to_tree(infix)
+    return _tree_value(tree, tree[0], values, parser)
+
+def path_unoptimized(tokens: dict, infix: str, values: dict):
+    parser = Parser(optimize = False, sort = False, tokens = tokens)
+    return _list_value(parser.parse(infix), values, parser)
+
+def path_folded(tokens: dict, infix: str, values: dict):
+    parser = Parser(optimize = True, sort = False, tokens = tokens)
+    return _list_value(parser.parse(infix), values, parser)
+
+def path_scheduled(tokens: dict, infix: str, values: dict):
+    parser = Parser(optimize = True, sort = True, tokens = tokens)
+    return _list_value(parser.parse(infix), values, parser)
+
+def path_formulas(tokens: dict, infix: str, values: dict):
+    from arithmetic_parsing.formulas import compile_formulas
+    compiled = compile_formulas({"result": infix}, Parser(tokens = tokens))
+    return compiled.evaluate(values)["result"]
+
+def path_gradient(tokens: dict, infix: str, values: dict):
+    from arithmetic_parsing.gradient import differentiate
+    parser = Parser(tokens = tokens)
+    return differentiate(parser.parse(infix), list(values)).evaluate(values)[0]
+
+def path_assembly(tokens: dict, infix: str, values: dict):
+    from arithmetic_parsing.examples.assembly import listToAssembly
+    # idiv is integer division, so it can only be compared without division
+    if "/" in infix or any(not isinstance(v, int) for v in values.values()):
+        return None
+    tree_list = Parser(tokens = tokens).parse(infix).as_list()
+    if not tree_list:
+        return None
+    asm = listToAssembly([expr[:] for expr in tree_list], infix)
+    return _emulate(asm, values)["rax"]
+
+def path_native(tokens: dict, infix: str, values: dict):
+    from arithmetic_parsing.backends import CBackend
+    compiled = CBackend().compile(Parser(tokens = tokens).parse(infix))
+    return compiled.evaluate("base", values)[0]
+
+paths = {
+    "tree": path_tree,
+    "unoptimized": path_unoptimized,
+    "folded": path_folded,
+    "scheduled": path_scheduled,
+    "formulas": path_formulas,
+    "gradient": path_gradient,
+    "assembly": path_assembly,
+    "native": path_native,
+}
+
+# listToAssembly is a demonstration, and only has two registers,
+# and the native path runs the C compiler for every expression,
+# so they are not checked unless asked for
+default_paths = [name for name in paths if name not in ["assembly", "native"]]
+
+
+def _agree(expected, actual) -> bool:
+    return math.isclose(expected, actual, rel_tol = 1e-9, abs_tol = 1e-9)
+
+
+def check(node, values: dict, tokens: dict = basicTokens, names: list[str] = default_paths, timings: dict = None) -> list[str]:
+    """
+        Checks every path against the reference for one expression.
+        Returns a list of disagreements, which is empty if they all agree
+
+        - timings [dict] = None
+            If given, the time spent in each path is added to it
+    """
+    try:
+        expected = reference(node, values, tokens)
+    except ZeroDivisionError:
+        # Nothing to compare against
+        return []
+
+    infix = render(node, tokens)
+    problems: list[str] = []
+    for name in names:
+        start = time.perf_counter()
+        try:
+            actual = paths[name](tokens, infix, values)
+            if actual is not None and not _agree(expected, actual):
+                problems.append(f"{name}: {infix} gave {actual}, expected {expected}")
+            elif name == "gradient":
+                # The value is right, so check the derivatives too
+                problems += check_derivatives(node, values, tokens)
+        except Exception as e:
+            problems.append(f"{name}: {infix} raised {type(e).__name__}: {e}")
+        if timings is not None:
+            timings[name] = timings.get(name, 0.0) + time.perf_counter() - start
+    return problems
+
+
+def _smaller(node):
+    """
+        Every expression that is one step simpler than node
+    """
+    if isinstance(node, str):
+        if node not in ["0", "1"]:
+            yield "1"
+        return
+    op, a, b = node
+    yield a
+    yield b
+    for smaller in _smaller(a):
+        yield (op, smaller, b)
+    for smaller in _smaller(b):
+        yield (op, a, smaller)
+
+
+def shrink(node, values: dict, tokens: dict = basicTokens, names: list[str] = default_paths):
+    """
+        Shrinks an expression that fails check to the smallest one
+        that still fails, by repeatedly trying simpler expressions
+    """
+    shrinking = True
+    while shrinking:
+        shrinking = False
+        for smaller in _smaller(node):
+            if check(smaller, values, tokens, names):
+                node = smaller
+                shrinking = True
+                break
+    return node
+
+
+def fuzz(seed: int, count: int, size: int = 8, depth: int = 5, names: list[str] = default_paths, tokens: dict = basicTokens) -> dict:
+    """
+        Checks count random expressions, starting from seed.
+        Each expression uses its own seed, so any failure can be
+        made again with fuzz(its seed, 1, ...)
+
+        Returns a dictionary with the failures (shrunk), the number of
+        expressions checked and the time spent in each path
+    """
+    ops = operators(tokens)
+    timings: dict[str, float] = {}
+    failures: list[dict] = []
+
+    for case_seed in range(seed, seed + count):
+        rng = random.Random(case_seed)
+        node = random_tree(rng, ops, rng.randint(0, size), depth)
+        values = {name: rng.randint(-20, 20) for name in default_names}
+
+        problems = check(node, values, tokens, names, timings)
+        if problems:
+            small = shrink(node, values, tokens, names)
+            failures.append({
+                "seed": case_seed,
+                "expression": render(node, tokens),
+                "shrunk": render(small, tokens),
+                "values": values,
+                "problems": check(small, values, tokens, names)
+            })
+
+    return {"checked": count, "failures": failures, "timings": timings}
+
+
+def _fuzz_chunk(args: tuple) -> dict:
+    return fuzz(*args)
+
+
+def fuzz_parallel(seed: int, count: int, size: int = 8, depth: int = 5, names: list[str] = default_paths, jobs: int = None, tokens: dict = basicTokens) -> dict:
+    """
+        Runs fuzz across several processes, and combines the results.
+        Gives the same failures as fuzz with the same arguments
+
+        - jobs [int] = None
+            How many processes to use. Defaults to the number of cores
+
+        - tokens [dict] = basicTokens
+            The token table. Its functions are sent to the other
+            processes, so they must be defined at module level
+    """
+    jobs = jobs or os.cpu_count() or 1
+    chunk = max(1, math.ceil(count / (jobs * 4)))
+    chunks = [
+        (start, min(chunk, seed + count - start), size, depth, names, tokens)
+        for start in range(seed, seed + count, chunk)
+    ]
+
+    combined = {"checked": 0, "failures": [], "timings": {}}
+    with ProcessPoolExecutor(jobs) as pool:
+        for result in pool.map(_fuzz_chunk, chunks):
+            combined["checked"] += result["checked"]
+            combined["failures"] += result["failures"]
+            for name, spent in result["timings"].items():
+                combined["timings"][name] = combined["timings"].get(name, 0.0) + spent
+    return combined
+
+
+def load_tokens(spec: str) -> dict:
+    """
+        Imports a token table from "module:attribute"
+    """
+    module, _, attribute = spec.partition(":")
+    if not attribute:
+        raise ValueError(f"expected module:attribute, got {spec!r}")
+    return getattr(importlib.import_module(module), attribute)
+
+
+def main():
+    parser = argparse.ArgumentParser(description = 'Differential fuzzing of arithmetic_parsing')
+    parser.add_argument('--seed', type = int, default = 0,
+        help = 'The first seed'
+    )
+    parser.add_argument('--count', type = int, default = 1000,
+        help = 'How many expressions to check'
+    )
+    parser.add_argument('--size', type = int, default = 8,
+        help = 'The maximum number of operators in an expression'
+    )
+    parser.add_argument('--depth', type = int, default = 5,
+        help = 'The maximum depth of an expression'
+    )
+    parser.add_argument('--paths', nargs = "+", default = default_paths,
+        choices = list(paths),
+        help = 'The paths to check'
+    )
+    parser.add_argument('--tokens', default = None,
+        help = 'A token table to use instead of basicTokens, as module:attribute'
+    )
+    parser.add_argument('-j', '--jobs', type = int, default = 1,
+        help = 'How many processes to use. 0 uses every core'
+    )
+    args = parser.parse_args()
+
+    tokens = load_tokens(args.tokens) if args.tokens else basicTokens
+
+    start = time.perf_counter()
+    if args.jobs == 1:
+        result = fuzz(args.seed, args.count, args.size, args.depth, args.paths, tokens)
+    else:
+        result = fuzz_parallel(args.seed, args.count, args.size, args.depth, args.paths, args.jobs or None, tokens)
+    elapsed = time.perf_counter() - start
+
+    print(f"checked {result['checked']} expressions in {elapsed:.2f}s")
+    for name, spent in result["timings"].items():
+        print(f"{name}: {result['checked'] / spent:.0f} expressions/s")
+
+    for failure in result["failures"]:
+        print(f"FAIL (seed {failure['seed']}): {failure['shrunk']} with {failure['values']}")
+        for problem in failure["problems"]:
+            print(f"    {problem}")
+
+    sys.exit(1 if result["failures"] else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+from arithmetic_parsing import Parser, ParseResult
+from arithmetic_parsing.benchmarks.fuzz import operators, random_tree, render
+import tracemalloc
+import argparse
+import random
+import sys
+import gc
+
+
+"""
+    Measures how much memory parse results keep alive
+    using tracemalloc, and fails if it goes over budget
+"""
+
+# The default budget, in bytes per retained result
+DEFAULT_BUDGET = 1024
+
+
+def random_expressions(seed: int, count: int, depth: int, parser: Parser = None) -> list[str]:
+    """
+        Creates count random expressions with at most depth levels of
+        operators, using the fuzzer's generator.
+        Expressions that do not parse (like a constant division by zero)
+        are replaced with new ones
+    """
+    if parser is None:
+        parser = Parser()
+
+    rng = random.Random(seed)
+    ops = operators(parser.tokens)
+
+    expressions: list[str] = []
+    while len(expressions) < count:
+        expr = render(random_tree(rng, ops, rng.randint(0, 2 ** depth - 1), depth), parser.tokens)
+        try:
+            parser.parse(expr)
+        except ZeroDivisionError:
+            continue
+        expressions.append(expr)
+    return expressions
+
+
+def measure_retained(expressions: list[str], parser: Parser = None, touch: bool = False, release: bool = False) -> float:
+    """
+        Parses every expression, keeping the results,
+        and returns the bytes kept alive per result
+
+        - expressions [list[str]]
+            The expressions to parse
+
+        - parser [Parser] = None
+            The parser to use. Defaults to Parser()
+
+        - touch [bool] = False
+            Access the prefix, postfix and tree of every result,
+            so they are built
+
+        - release [bool] = False
+            Call release() on every result after touching it
+    """
+    if parser is None:
+        parser = Parser()
+
+    # Parse one first, so anything imported or cached on first use
+    # (like treelib) is not counted
+    warm = parser.parse("a + 1")
+    if touch:
+        warm.tree
+
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+
+        results: list[ParseResult] = []
+        for expr in expressions:
+            result = parser.parse(expr)
+            if touch:
+                result.prefix, result.postfix, result.tree
+            if release:
+                result.release()
+            results.append(result)
+
+        gc.collect()
+        after = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+
+    # Do not count the list holding the results
+    retained = after - before - sys.getsizeof(results)
+    return retained / len(expressions)
+
+
+def main():
+    parser = argparse.ArgumentParser(description = 'Check the memory kept alive by parse results')
+    parser.add_argument('--budget', type = int, default = DEFAULT_BUDGET,
+        help = 'The budget in bytes per retained result'
+    )
+    parser.add_argument('--count', type = int, default = 2000,
+        help = 'How many results to keep'
+    )
+    parser.add_argument('--depth', type = int, default = 4,
+        help = 'The maximum depth of the random expressions'
+    )
+    parser.add_argument('--seed', type = int, default = 0,
+        help = 'The seed for the random expressions'
+    )
+    parser.add_argument('--touch', action = "store_true", default = False,
+        help = 'Build the prefix, postfix and tree of every result'
+    )
+    parser.add_argument('--release', action = "store_true", default = False,
+        help = 'Release every result after building it'
+    )
+    args = parser.parse_args()
+
+    expressions = random_expressions(args.seed, args.count, args.depth)
+
+    per_result = measure_retained(expressions, touch = args.touch, release = args.release)
+    print(f"{per_result:.0f} bytes per result, budget is {args.budget}")
+
+    if per_result > args.budget:
+        print("FAIL: over budget")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+import subprocess
+import argparse
+import sys
+
+
+"""
+    Measures how long it takes to import arithmetic_parsing
+    using python -X importtime, and fails if it goes over budget
+"""
+
+# The default budget for importing arithmetic_parsing, in microseconds
+# This leaves room for compiling the package when there is no bytecode cache
+DEFAULT_BUDGET_US = 25000
+
+# Modules that must not be imported by a plain "import arithmetic_parsing"
+LAZY_MODULES = [
+    "treelib",
+    "arithmetic_parsing.examples",
+    "arithmetic_parsing.examples.assembly",
+]
+
+
+def measure_import(module: str = "arithmetic_parsing", python: str = sys.executable) -> dict[str, tuple[int, int]]:
+    """
+        Imports a module in a fresh interpreter with -X importtime
+
+        Returns a dictionary of module name -> (self time, cumulative time)
+        in microseconds, for every module imported
+    """
+
+    # Run a fresh interpreter so nothing is cached
+    proc = subprocess.run(
+        [python, "-X", "importtime", "-c", f"import {module}"],
+        capture_output = True,
+        text = True,
+        check = True
+    )
+
+    # The output is on stderr, and looks like:
+    # import time:   self [us] | cumulative | imported package
+    times: dict[str, tuple[int, int]] = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        parts = line[len("import time:"):].split("|")
+        # Skip the header
+        if not parts[0].strip().isnumeric():
+            continue
+        times[parts[2].strip()] = (int(parts[0]), int(parts[1]))
+
+    # Return the times
+    return times
+
+
+def check_budget(budget_us: int = DEFAULT_BUDGET_US, runs: int = 5) -> list[str]:
+    """
+        Checks the import time of arithmetic_parsing against budget_us
+
+        The best of several runs is used, to reduce noise.
+        Returns a list of problems, which is empty if everything is fine
+    """
+    problems: list[str] = []
+
+    best = None
+    for _ in range(runs):
+        times = measure_import()
+
+        # Check that nothing lazy got imported
+        for module in LAZY_MODULES:
+            if module in times:
+                problems.append(f"{module} was imported eagerly")
+
+        cumulative = times["arithmetic_parsing"][1]
+        if best is None or cumulative < best:
+            best = cumulative
+
+    if best > budget_us:
+        problems.append(f"import took {best}us, budget is {budget_us}us")
+
+    # Remove duplicates, keeping the order
+    return list(dict.fromkeys(problems))
+
+
+def main():
+    parser = argparse.ArgumentParser(description = 'Check the import time of arithmetic_parsing')
+    parser.add_argument('--budget', type = int, default = DEFAULT_BUDGET_US,
+        help = 'The import time budget in microseconds'
+    )
+    parser.add_argument('--runs', type = int, default = 5,
+        help = 'How many times to import. The best time is used'
+    )
+    args = parser.parse_args()
+
+    problems = check_budget(args.budget, args.runs)
+
+    # Print the breakdown of the last run
+    for name, (self_us, cumulative_us) in measure_import().items():
+        if name.startswith("arithmetic_parsing"):
+            print(f"{name}: {self_us}us self, {cumulative_us}us cumulative")
+
+    for problem in problems:
+        print(f"FAIL: {problem}")
+
+    sys.exit(1 if problems else 0)
+
+if __name__ == "__main__":
+    main()
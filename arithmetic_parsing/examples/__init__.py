@@ -1,2 +1,13 @@
-import arithmetic_parsing
+import importlib
 
+# Examples are only imported when they are first accessed
+_lazy_submodules = {
+    "assembly",
+}
+
+def __getattr__(name: str):
+    if name in _lazy_submodules:
+        module = importlib.import_module(f".{name}", __name__)
+        globals()[name] = module
+        return module
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,4 +1,5 @@
 from itertools import cycle
+from arithmetic_parsing.mathFuncs import is_name
 import arithmetic_parsing
 import string
 registers = [
@@ -29,12 +30,13 @@ registers = [
         ("ah",   8),
         ("bh",   8),
         ("ch",   8),
+        ("dh",   8),
         ("al",   8),
         ("bl",   8),
         ("cl",   8),
         ("dl",   8),
-        ("sl",   8),
-        ("dl",   8),
+        ("sil",  8),
+        ("dil",  8),
         ("bpl",  8),
         ("spl",  8)
 ]
@@ -44,6 +46,24 @@ registers.extend([(f"r{i}w", 16) for i in range(8,16)])
 registers.extend([(f"r{i}b", 8) for i in range(8,16)])
 reg, regsize = zip(*registers)
 
+# The same register at each width, by its 64 bit name
+register_widths = {
+    "rax": {64: "rax", 32: "eax", 16: "ax", 8: "al"},
+    "rbx": {64: "rbx", 32: "ebx", 16: "bx", 8: "bl"},
+    "rcx": {64: "rcx", 32: "ecx", 16: "cx", 8: "cl"},
+    "rdx": {64: "rdx", 32: "edx", 16: "dx", 8: "dl"},
+    "rsi": {64: "rsi", 32: "esi", 16: "si", 8: "sil"},
+    "rdi": {64: "rdi", 32: "edi", 16: "di", 8: "dil"},
+    "rbp": {64: "rbp", 32: "ebp", 16: "bp", 8: "bpl"},
+    "rsp": {64: "rsp", 32: "esp", 16: "sp", 8: "spl"},
+}
+register_widths.update({
+    f"r{i}": {64: f"r{i}", 32: f"r{i}d", 16: f"r{i}w", 8: f"r{i}b"} for i in range(8,16)
+})
+
+# Size keywords for memory operands
+memory_sizes = {64: "qword", 32: "dword", 16: "word", 8: "byte"}
+
 def resolve_value(value: str) -> str:
     if value.isnumeric():
         return f"{value}"
@@ -54,7 +74,46 @@ def resolve_value(value: str) -> str:
     else:
         return f"[{value}]"
 
-def listToAssembly(tree_list: list[list], origExpr: str, namespace: str = "base", reg1: str = "rax", reg2: str = "rbx"):
+def listToAssembly(tree_list: list[list], origExpr: str, namespace: str = "base", reg1: str = "rax", reg2: str = "rbx", ranges = None):
+    """
+        Converts a tree_list to NASM
+
+        - ranges [RangeAnalysis] = None
+            The result of arithmetic_parsing.ranges.analyze for tree_list.
+            If given, the narrowest registers that fit every value are used,
+            and divisions check for zero (jumping to {namespace}_divide_by_zero)
+            unless the ranges show the divisor can never be zero.
+            Dividing by a constant zero always jumps.
+            Lists with * or / use at least 16 bits, since imul and
+            idiv have no two operand 8 bit form.
+    """
+
+    # Width of the registers
+    width = 64
+
+    # Indexes of divisions that need to check for zero
+    checks: set[int] = set()
+
+    if ranges is not None:
+        # Find every operand, before they are replaced with registers
+        operands = []
+        for expr in tree_list:
+            operands += expr[1:] if expr[0] == "const" else [expr[1], *expr[3:]]
+
+        # Use the narrowest width that fits, or 64 bits if nothing does
+        width = ranges.narrowest_width(operands) or 64
+
+        # There is no two operand imul or idiv for 8 bit registers
+        if width < 16 and any(expr[0] == "dyn" and expr[2] in ["*", "/"] for expr in tree_list):
+            width = 16
+        reg1 = register_widths.get(reg1, {}).get(width, reg1)
+        reg2 = register_widths.get(reg2, {}).get(width, reg2)
+
+        for i, expr in enumerate(tree_list):
+            # Constant divisors are only checked if they are zero
+            if expr[0] == "dyn" and expr[2] == "/" and ranges.may_be_zero(expr[4]):
+                checks.add(i)
+
     # Replace variables with registers
 
     # Create a cycle
@@ -128,7 +187,7 @@ def listToAssembly(tree_list: list[list], origExpr: str, namespace: str = "base"
         ]
     
     # Iterate over expressions
-    for ex in expr:
+    for i, ex in enumerate(expr):
         reg = ex[1] # Get register
         op = ex[2]  # Get operator
         a = ex[3]   # Get A
@@ -157,6 +216,20 @@ def listToAssembly(tree_list: list[list], origExpr: str, namespace: str = "base"
                 f"sub {reg}, {resolve_value(b)}"
             ]
         elif op == "/": # Divide
+            if i in checks and not is_name(b):
+                # The divisor is a constant zero, so always jump out
+                out += [
+                    f"jmp {namespace}_divide_by_zero"
+                ]
+            elif i in checks:
+                # Jump out if the divisor is zero
+                divisor = resolve_value(b)
+                if divisor.startswith("["):
+                    divisor = f"{memory_sizes[width]} {divisor}"
+                out += [
+                    f"cmp {divisor}, 0",
+                    f"je {namespace}_divide_by_zero"
+                ]
             out += [
                 f"idiv {reg}, {resolve_value(b)}"
             ]
@@ -0,0 +1,275 @@
+from . import Parser, check_namespace, commutative
+from .mathFuncs import is_name, to_number
+
+
+"""
+    Compiles many formulas that reference each other into one schedule.
+
+    Formulas are referenced by name from other formulas, for example:
+        {
+            "subtotal": "price * quantity",
+            "tax": "subtotal * 2 / 10",
+            "total": "subtotal + tax"
+        }
+    Any name that is not a formula is an input.
+"""
+
+class FormulaCycleError(ValueError):
+    """
+        Raised when formulas reference each other in a cycle
+    """
+    def __init__(self, cycle: list[str]):
+        self.cycle = cycle
+        super().__init__(f"formulas reference each other in a cycle: {' -> '.join(cycle)}")
+
+
+class FormulaSet:
+    """
+        A compiled set of formulas. Use compile_formulas to create one.
+
+        - schedule [list[list]]
+            The combined instructions, in the same format as ParseResult.as_list().
+            Every shared subexpression appears once.
+
+        - results [dict[str, str]]
+            Formula name -> the operand holding its value.
+            This is a schedule variable, an input, or a constant
+
+        - order [list[str]]
+            Formula names, with every formula after the formulas it references
+
+        - dependencies [dict[str, set[str]]]
+            Formula name -> names of the formulas it references directly
+
+        - inputs [set[str]]
+            Every name that is not a formula
+    """
+    schedule: list[list]
+    results: dict[str, str]
+    order: list[str]
+    dependencies: dict[str, set[str]]
+    inputs: set[str]
+
+    def __init__(self, parser: Parser):
+        self.parser = parser
+        self.schedule = []
+        self.results = {}
+        self.order = []
+        self.dependencies = {}
+        self.inputs = set()
+
+        # Formula name -> every input and formula name it references
+        self._names: dict[str, set[str]] = {}
+
+        # The values from the last evaluate or update
+        self.values: dict = {}
+
+        # Operand -> indexes of the instructions that use it
+        # This is built the first time update is called
+        self._users: dict[str, list[int]] = None
+
+    def _run(self, indexes):
+        """
+            Computes the given instructions, in order, into self.values
+        """
+        values = self.values
+        tokens = self.parser.tokens
+        for i in indexes:
+            _, vname, op, a, b = self.schedule[i]
+            a = values[a] if is_name(a) else to_number(a)
+            b = values[b] if is_name(b) else to_number(b)
+            values[vname] = tokens[op][1](a, b)
+
+    def _result(self, name: str):
+        result = self.results[name]
+        return self.values[result] if is_name(result) else to_number(result)
+
+    def evaluate(self, inputs: dict) -> dict:
+        """
+            Evaluates every formula. Each instruction is computed once,
+            no matter how many formulas share it.
+
+            - inputs [dict]
+                Input name -> value. Every input must be given.
+
+            Returns a dictionary of formula name -> value
+        """
+        missing = self.inputs - inputs.keys()
+        if missing:
+            raise KeyError(f"missing inputs: {', '.join(sorted(missing))}")
+
+        self.values = dict(inputs)
+        self._run(range(len(self.schedule)))
+
+        return {name: self._result(name) for name in self.order}
+
+    def update(self, changes: dict) -> dict:
+        """
+            Changes some inputs after evaluate, and only recomputes
+            what depends on them.
+
+            - changes [dict]
+                Input name -> new value
+
+            Returns a dictionary of formula name -> value, for the
+            formulas downstream of the changed inputs
+        """
+        if not self.values:
+            raise RuntimeError("evaluate must be called before update")
+
+        unknown = changes.keys() - self.inputs
+        if unknown:
+            raise KeyError(f"not inputs: {', '.join(sorted(unknown))}")
+
+        self.values.update(changes)
+
+        # Find every instruction downstream of the changes
+        dirty = self._downstream_instructions(changes.keys())
+        self._run(sorted(dirty))
+
+        changed = set(changes) | {self.schedule[i][1] for i in dirty}
+        return {name: self._result(name) for name in self.order if self.results[name] in changed}
+
+    def _downstream_instructions(self, names) -> set[int]:
+        if self._users is None:
+            self._users = {}
+            for i, expr in enumerate(self.schedule):
+                for x in expr[3:]:
+                    self._users.setdefault(x, []).append(i)
+
+        users = self._users
+        dirty: set[int] = set()
+        stack = list(names)
+        while stack:
+            for i in users.get(stack.pop(), []):
+                if i not in dirty:
+                    dirty.add(i)
+                    stack.append(self.schedule[i][1])
+        return dirty
+
+    def downstream(self, names) -> list[str]:
+        """
+            Returns the formulas that need to be recomputed when
+            any of the given inputs or formulas change, in order
+
+            - names [iterable[str]]
+                Input or formula names
+        """
+        names = set(names)
+        for name in self.order:
+            if self._names[name] & names:
+                names.add(name)
+        return [name for name in self.order if name in names]
+
+
+def _order(dependencies: dict[str, set[str]]) -> list[str]:
+    """
+        Sorts formulas so that every formula comes after the formulas it
+        references. Raises FormulaCycleError if there is a cycle.
+    """
+    order: list[str] = []
+
+    # 0 is unvisited, 1 is being visited, 2 is done
+    state: dict[str, int] = {name: 0 for name in dependencies}
+
+    for root in dependencies:
+        if state[root]:
+            continue
+        # Iterative depth first search, so long chains do not hit
+        # the recursion limit
+        path = [root]
+        stack = [iter(sorted(dependencies[root]))]
+        state[root] = 1
+        while stack:
+            for dep in stack[-1]:
+                if state[dep] == 1:
+                    # dep is already on the path, so this is a cycle
+                    raise FormulaCycleError(path[path.index(dep):] + [dep])
+                if state[dep] == 0:
+                    state[dep] = 1
+                    path.append(dep)
+                    stack.append(iter(sorted(dependencies[dep])))
+                    break
+            else:
+                # Every dependency is done
+                done = path.pop()
+                stack.pop()
+                state[done] = 2
+                order.append(done)
+
+    return order
+
+
+def compile_formulas(formulas: dict[str, str], parser: Parser = None, namespace: str = "shared") -> FormulaSet:
+    """
+        Compiles formulas that can reference each other by name.
+
+        - formulas [dict[str, str]]
+            Formula name -> infix expression
+
+        - parser [Parser] = None
+            The parser to use. Defaults to Parser()
+
+        - namespace [str] = "shared"
+            The namespace to use for the schedule variables.
+            Inputs and formulas can not be named {namespace}_<number>
+    """
+    if parser is None:
+        parser = Parser()
+
+    compiled = FormulaSet(parser)
+
+    # Parse every formula, without optimizing or sorting.
+    # Those are done over the whole set below
+    lists: dict[str, list[list]] = {}
+    for name, expr in formulas.items():
+        lists[name] = parser.prefix_to_list(parser.infix_to_prefix(expr), name)[0]
+
+        # Every name this formula uses
+        names = {x for row in lists[name] for x in row[2:] if row[0] == "const" and is_name(x)}
+        compiled._names[name] = names
+        compiled.dependencies[name] = names & formulas.keys()
+        compiled.inputs |= names - formulas.keys()
+
+    # Schedule variables are named {namespace}_0, {namespace}_1, ...
+    # so no input or formula can be named like that
+    check_namespace(compiled.inputs | formulas.keys(), namespace)
+
+    compiled.order = _order(compiled.dependencies)
+
+    # (op, a, b) -> the variable that already holds it
+    computed: dict[tuple, str] = {}
+
+    for name in compiled.order:
+        # Variables of this formula -> the operand that holds them
+        operands: dict[str, str] = {}
+
+        for expr in lists[name]:
+            if expr[0] == "const":
+                x = expr[2]
+                # Other formulas are replaced by their result
+                operands[expr[1]] = compiled.results.get(x, x)
+                continue
+
+            _, vname, op, a, b = expr
+            a = operands[a]
+            b = operands[b]
+
+            # Fold constants, unless it would fail
+            if not is_name(a) and not is_name(b):
+                try:
+                    operands[vname] = str(parser.tokens[op][1](to_number(a), to_number(b)))
+                    continue
+                except ZeroDivisionError:
+                    pass
+
+            key = (op, *sorted((a, b))) if op in commutative else (op, a, b)
+            if key not in computed:
+                computed[key] = f"{namespace}_{len(compiled.schedule)}"
+                compiled.schedule.append(["dyn", computed[key], op, a, b])
+            operands[vname] = computed[key]
+
+        # The last row is the whole formula
+        compiled.results[name] = operands[lists[name][-1][1]]
+
+    return compiled
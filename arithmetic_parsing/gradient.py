@@ -0,0 +1,201 @@
+from . import Parser, ParseResult, check_namespace, commutative
+from .mathFuncs import is_name, to_number
+
+
+"""
+    Reverse mode (adjoint) differentiation of parse results.
+
+    The derivative instructions are added after the instructions of the
+    expression, in the same format as ParseResult.as_list(), so the
+    gradient of every variable costs a small multiple of evaluating
+    the expression once.
+"""
+
+class Gradient:
+    """
+        The result of differentiate
+
+        - tree_list [list[list]]
+            The instructions of the expression, followed by the
+            instructions of the derivatives
+
+        - output [str]
+            The operand holding the value of the expression
+
+        - derivatives [dict[str, str]]
+            Variable -> the operand holding the derivative of the
+            expression with respect to that variable
+    """
+    tree_list: list[list]
+    output: str
+    derivatives: dict[str, str]
+
+    def __init__(self, parser: Parser):
+        self.parser = parser
+
+    def as_list(self):
+        return self.tree_list
+
+    def evaluate(self, values: dict) -> tuple:
+        """
+            Evaluates the expression and its derivatives
+
+            - values [dict]
+                Variable name -> value
+
+            Returns the value, and a dictionary of variable -> derivative
+        """
+        values = self.parser.evaluate_list(self.tree_list, values)
+
+        def resolve(x):
+            return values[x] if is_name(x) else to_number(x)
+
+        return resolve(self.output), {var: resolve(d) for var, d in self.derivatives.items()}
+
+
+class _Emitter:
+    """
+        Appends instructions to rows, folding constants, removing
+        identities and reusing instructions that already exist
+    """
+    def __init__(self, rows: list[list], parser: Parser, namespace: str):
+        self.rows = rows
+        self.parser = parser
+        self.namespace = namespace
+
+        # (op, a, b) -> the variable that already holds it
+        self.computed: dict[tuple, str] = {}
+
+    def _key(self, op: str, a: str, b: str) -> tuple:
+        return (op, *sorted((a, b))) if op in commutative else (op, a, b)
+
+    def emit(self, op: str, a: str, b: str) -> str:
+        # Both constant, so just calculate it
+        if not is_name(a) and not is_name(b):
+            try:
+                return str(self.parser.tokens[op][1](to_number(a), to_number(b)))
+            except ZeroDivisionError:
+                pass
+
+        # Remove x + 0, x - 0, x * 1, x * 0 and x / 1
+        aNum = None if is_name(a) else to_number(a)
+        bNum = None if is_name(b) else to_number(b)
+        if op == "+" and aNum == 0:
+            return b
+        if op in ["+", "-"] and bNum == 0:
+            return a
+        if op == "*" and (aNum == 0 or bNum == 0):
+            return "0"
+        if op == "*" and aNum == 1:
+            return b
+        if op in ["*", "/"] and bNum == 1:
+            return a
+
+        key = self._key(op, a, b)
+        if key not in self.computed:
+            # These are renamed when the list is optimized. Inputs can
+            # not be named like this, which differentiate checks
+            vname = f"{self.namespace}_{len(self.rows)}"
+            self.rows.append(["dyn", vname, op, a, b])
+            self.computed[key] = vname
+        return self.computed[key]
+
+
+def differentiate(result: ParseResult, variables: list[str], parser: Parser = None, namespace: str = "grad") -> Gradient:
+    """
+        Differentiates a parse result with respect to variables
+
+        - result [ParseResult]
+            The result of Parser.parse
+
+        - variables [list[str]]
+            The variables to differentiate with respect to
+
+        - parser [Parser] = None
+            The parser used to optimize the output.
+            Defaults to the parser that made result
+
+        - namespace [str] = "grad"
+            The namespace to use for the output variables.
+            Variables can not be named {namespace}_<number>
+    """
+    if parser is None:
+        parser = result._parser if result._parser is not None else Parser()
+
+    source, output = result.instructions(namespace)
+
+    # Inputs keep their names, so they can not look like output variables
+    defined = {expr[1] for expr in source}
+    names = {x for expr in source for x in expr[3:]} | {output}
+    check_namespace({x for x in names if is_name(x) and x not in defined} | set(variables), namespace)
+
+    rows: list[list] = []
+    emitter = _Emitter(rows, parser, namespace)
+    emit = emitter.emit
+
+    # Copy the instructions through the emitter.
+    # Variable of result -> the operand that holds it now
+    aliases: dict[str, str] = {}
+    for _, vname, op, a, b in source:
+        aliases[vname] = emit(op, aliases.get(a, a), aliases.get(b, b))
+    output = aliases.get(output, output)
+
+    # The derivative instructions are added to rows, after these
+    forward = list(rows)
+
+    # Variable -> the operand holding its adjoint
+    adjoints: dict[str, str] = {}
+
+    def accumulate(x: str, contribution: str, negative: bool = False):
+        # Constants do not have adjoints
+        if not is_name(x):
+            return
+        if x not in adjoints:
+            adjoints[x] = emit("-", "0", contribution) if negative else contribution
+        else:
+            adjoints[x] = emit("-" if negative else "+", adjoints[x], contribution)
+
+    if is_name(output):
+        adjoints[output] = "1"
+
+    # Go backwards over the expression, passing each adjoint to the operands
+    for expr in reversed(forward):
+        _, vname, op, a, b = expr
+        if vname not in adjoints:
+            continue
+        dv = adjoints[vname]
+
+        if op == "+":
+            accumulate(a, dv)
+            accumulate(b, dv)
+        elif op == "-":
+            accumulate(a, dv)
+            accumulate(b, dv, negative = True)
+        elif op == "*":
+            accumulate(a, emit("*", dv, b))
+            accumulate(b, emit("*", dv, a))
+        elif op == "/":
+            # d(a/b)/db is -a/b^2, which is -(a/b)/b
+            accumulate(a, emit("/", dv, b))
+            accumulate(b, emit("/", emit("*", dv, vname), b), negative = True)
+        else:
+            raise ValueError(f"can not differentiate operator {op!r}")
+
+    derivatives = {var: adjoints.get(var, "0") for var in variables}
+
+    # Remember which rows hold the outputs, since optimizing renames them.
+    # The rows themselves are kept, just moved and renamed
+    holders = {expr[1]: expr for expr in rows}
+
+    tree_list = parser.optimize_tree_list([rows, [[expr[1]] for expr in rows]], namespace)
+    if parser.sort:
+        tree_list = parser.sort_tree_list(tree_list, namespace)
+
+    def rename(x: str) -> str:
+        return holders[x][1] if x in holders else x
+
+    gradient = Gradient(parser)
+    gradient.tree_list = tree_list[0]
+    gradient.output = rename(output)
+    gradient.derivatives = {var: rename(d) for var, d in derivatives.items()}
+    return gradient
@@ -8,4 +8,17 @@ def sub(a,b):
     return a - b
 
 def div(a,b):
-    return a / b
\ No newline at end of file
+    return a / b
+
+def is_name(value):
+    # Names (variables) start with a letter or an underscore,
+    # anything else is a number
+    value = str(value)
+    return value[:1].isalpha() or value[:1] == "_"
+
+def to_number(value):
+    # Converts a constant operand to an int, or a float if it is not whole
+    try:
+        return int(value)
+    except ValueError:
+        return float(value)
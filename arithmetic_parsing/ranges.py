@@ -0,0 +1,183 @@
+from .mathFuncs import is_name, to_number
+import math
+
+
+"""
+    Interval (range) analysis of tree_lists.
+
+    Given bounds for the inputs, this works out the smallest and largest
+    value every variable can have, and reports where an overflow or a
+    division by zero is possible.
+"""
+
+# Signed integer widths, from narrowest to widest
+widths = [8, 16, 32, 64]
+
+# Any value, for inputs without bounds
+unbounded = (-math.inf, math.inf)
+
+
+def limits(width: int) -> tuple[int, int]:
+    """
+        The smallest and largest value of a signed integer of width bits
+    """
+    return -(1 << (width - 1)), (1 << (width - 1)) - 1
+
+
+def _mul(x, y):
+    # Zero times infinity is zero here, since zero is exact
+    if x == 0 or y == 0:
+        return 0
+    return x * y
+
+
+def add(a: tuple, b: tuple) -> tuple:
+    return a[0] + b[0], a[1] + b[1]
+
+def sub(a: tuple, b: tuple) -> tuple:
+    return a[0] - b[1], a[1] - b[0]
+
+def mul(a: tuple, b: tuple) -> tuple:
+    products = [_mul(x, y) for x in a for y in b]
+    return min(products), max(products)
+
+def div(a: tuple, b: tuple) -> tuple:
+    # Anything can come out of dividing by a range that includes zero
+    if b[0] <= 0 <= b[1]:
+        return unbounded
+    quotients = [x / y for x in a for y in b if not (math.isinf(x) and math.isinf(y))]
+    if len(quotients) < 4:
+        return unbounded
+    return min(quotients), max(quotients)
+
+
+# Operator -> interval function
+interval_ops = {
+    "+": add,
+    "-": sub,
+    "*": mul,
+    "/": div
+}
+
+
+class RangeAnalysis:
+    """
+        The result of analyze
+
+        - ranges [dict[str, tuple]]
+            Variable -> (smallest, largest) value it can have.
+            Inputs are included.
+
+        - overflow [list[str]]
+            Variables that might not fit in the width that was analyzed for.
+            Variables that depend on a division by zero are not included,
+            since their range is not known
+
+        - division_by_zero [list[str]]
+            Variables computed by a division where the divisor might be zero
+    """
+    ranges: dict[str, tuple]
+    overflow: list[str]
+    division_by_zero: list[str]
+
+    def __init__(self, width: int):
+        self.width = width
+        self.ranges = {}
+        self.overflow = []
+        self.division_by_zero = []
+
+    def range_of(self, operand: str) -> tuple:
+        """
+            The range of a variable or a constant
+        """
+        if not is_name(operand):
+            value = to_number(operand)
+            return value, value
+        return self.ranges.get(operand, unbounded)
+
+    def may_be_zero(self, operand: str) -> bool:
+        low, high = self.range_of(operand)
+        return low <= 0 <= high
+
+    def narrowest_width(self, operands = None) -> int:
+        """
+            The narrowest signed integer width that every value fits in,
+            or None if some value does not fit in 64 bits
+
+            - operands [iterable[str]] = None
+                The operands to check. Defaults to every variable
+        """
+        if operands is None:
+            operands = self.ranges.keys()
+        ranges = [self.range_of(x) for x in operands]
+        low = min([r[0] for r in ranges], default = 0)
+        high = max([r[1] for r in ranges], default = 0)
+        for width in widths:
+            smallest, largest = limits(width)
+            if smallest <= low and high <= largest:
+                return width
+        return None
+
+    @property
+    def warnings(self) -> list[str]:
+        return [
+            f"{x} might overflow {self.width} bits" for x in self.overflow
+        ] + [
+            f"{x} might divide by zero" for x in self.division_by_zero
+        ]
+
+
+def analyze(tree_list: list[list], bounds: dict[str, tuple] = None, width: int = 64) -> RangeAnalysis:
+    """
+        Propagates ranges through a tree_list, in order
+
+        - tree_list [list[list]]
+            The list to analyze, like ParseResult.as_list()
+
+        - bounds [dict[str, tuple]] = None
+            Input name -> (smallest, largest) value.
+            Inputs without bounds can be any value
+
+        - width [int] = 64
+            The signed integer width to check for overflow
+    """
+    analysis = RangeAnalysis(width)
+    smallest, largest = limits(width)
+
+    # Every input used, with its bounds
+    for expr in tree_list:
+        for x in expr[2:] if expr[0] == "const" else expr[3:]:
+            if is_name(x) and x not in analysis.ranges:
+                analysis.ranges[x] = tuple((bounds or {}).get(x, unbounded))
+
+    # Variables whose range is unknown, because they depend on a
+    # division that might be by zero
+    unknown: set[str] = set()
+
+    for expr in tree_list:
+        if expr[0] == "const":
+            analysis.ranges[expr[1]] = analysis.range_of(expr[2])
+            if expr[2] in unknown:
+                unknown.add(expr[1])
+            continue
+
+        _, vname, op, a, b = expr
+        if op not in interval_ops:
+            # Nothing is known about custom operators
+            analysis.ranges[vname] = unbounded
+            continue
+
+        if op == "/" and analysis.may_be_zero(b):
+            analysis.division_by_zero.append(vname)
+            unknown.add(vname)
+        elif a in unknown or b in unknown:
+            unknown.add(vname)
+
+        low, high = interval_ops[op](analysis.range_of(a), analysis.range_of(b))
+        analysis.ranges[vname] = (low, high)
+
+        # Only the division by zero is reported for unknown ranges
+        if vname not in unknown and (low < smallest or high > largest):
+            analysis.overflow.append(vname)
+
+    return analysis
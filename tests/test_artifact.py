@@ -0,0 +1,94 @@
+import struct
+
+import pytest
+
+from arithmetic_parsing import Parser, artifact
+
+
+@pytest.fixture
+def parser():
+    return Parser()
+
+
+@pytest.fixture
+def results(parser):
+    return {
+        "total": parser.parse("price * quantity + tax", namespace="total"),
+        "margin": parser.parse("(price - cost) / price", namespace="margin"),
+        "constant": parser.parse("2 * 3", namespace="constant"),
+        "single": parser.parse("price", namespace="single"),
+    }
+
+
+def test_round_trip(results, parser):
+    bundle = artifact.loads(artifact.dumps(results, parser), parser)
+
+    assert list(bundle) == list(results)
+    assert len(bundle) == 4
+    assert "total" in bundle and "missing" not in bundle
+    for name, result in results.items():
+        assert bundle[name].as_list() == result.as_list()
+        assert bundle[name].infix == result.infix
+    assert bundle["total"].instructions() == results["total"].instructions()
+
+    # Results are cached
+    assert bundle["total"] is bundle["total"]
+
+
+def test_single_values_are_not_parsed_again(results, parser):
+    bundle = artifact.loads(artifact.dumps(results, parser), parser)
+
+    assert bundle["constant"].instructions() == ([], "6")
+    assert bundle["single"].instructions() == ([], "price")
+    # The output comes from the bundle, not from the prefix
+    assert bundle["constant"]._prefix is None
+    assert bundle["single"]._prefix is None
+
+
+def test_derived_fields_are_built_from_the_infix(results, parser):
+    result = artifact.loads(artifact.dumps(results, parser), parser)["margin"]
+    assert result.prefix == results["margin"].prefix
+    assert result.postfix == results["margin"].postfix
+
+
+def test_file_round_trip(results, parser, tmp_path):
+    path = str(tmp_path / "formulas.apir")
+    artifact.dump(results, parser, path)
+    bundle = artifact.load(path, parser)
+    assert {name: result.as_list() for name, result in bundle.items()} == {name: result.as_list() for name, result in results.items()}
+
+
+def test_options_mismatch(results, parser):
+    data = artifact.dumps(results, parser)
+    with pytest.raises(ValueError, match="different parser options"):
+        artifact.loads(data, Parser(sort=False))
+
+    # Without a parser, any options are accepted
+    assert artifact.loads(data).options_hash == artifact.options_hash(parser)
+
+
+def test_options_hash(parser):
+    assert artifact.options_hash(parser) == artifact.options_hash(Parser())
+    assert artifact.options_hash(parser) != artifact.options_hash(Parser(optimize=False))
+
+    tokens = dict(parser.tokens)
+    tokens["+"] = [3, tokens["+"][1]]
+    assert artifact.options_hash(parser) != artifact.options_hash(Parser(tokens=tokens))
+
+
+def test_version_mismatch(results, parser):
+    data = bytearray(artifact.dumps(results, parser))
+    # The version follows the 4 byte magic
+    struct.pack_into("<H", data, 4, artifact.FORMAT_VERSION + 1)
+    with pytest.raises(ValueError, match="unsupported bundle version"):
+        artifact.loads(bytes(data), parser)
+
+
+def test_not_a_bundle(parser, tmp_path):
+    with pytest.raises(ValueError, match="not a formula bundle"):
+        artifact.loads(b"\0" * 64, parser)
+
+    path = tmp_path / "empty.apir"
+    path.write_bytes(b"")
+    with pytest.raises(ValueError, match="not a formula bundle"):
+        artifact.load(str(path), parser)
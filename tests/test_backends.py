@@ -0,0 +1,138 @@
+from array import array
+import os
+
+import pytest
+
+from arithmetic_parsing import Parser
+from arithmetic_parsing.backends import AssemblyBackend, CBackend, CompileError, get_backend
+
+
+@pytest.fixture
+def parser():
+    return Parser()
+
+
+@pytest.fixture
+def results(parser):
+    return {
+        "total": parser.parse("price * quantity + tax", namespace="total"),
+        "margin": parser.parse("(price - cost) / price", namespace="margin"),
+        "constant": parser.parse("2 * 3", namespace="constant"),
+        "single": parser.parse("price", namespace="single"),
+    }
+
+
+def test_compile_and_cache(results, tmp_path, monkeypatch):
+    backend = CBackend(cache_dir=str(tmp_path))
+    compiled = backend.compile(results)
+
+    assert os.path.dirname(compiled.path) == str(tmp_path)
+    assert os.path.exists(compiled.path)
+
+    # The same batch is loaded from the cache, without compiling again
+    def build(source, path):
+        raise AssertionError("compiled again")
+    monkeypatch.setattr(backend, "_build", build)
+
+    again = backend.compile(results)
+    assert again.path == compiled.path
+    assert again("total", price=10, quantity=3, tax=2) == 32
+
+
+def test_evaluate_arrays_and_scalars(results, tmp_path):
+    compiled = CBackend(cache_dir=str(tmp_path)).compile(results)
+
+    assert compiled.inputs["total"] == ["price", "quantity", "tax"]
+    assert compiled("total", price=10, quantity=3, tax=2) == 32
+
+    # Sequences and single values can be mixed
+    out = compiled.evaluate("margin", {"price": [10, 20, 40], "cost": 8})
+    assert isinstance(out, array)
+    assert list(out) == pytest.approx([0.2, 0.6, 0.8])
+
+    out = compiled.evaluate("total", {"price": array("d", [1, 2]), "quantity": [3, 4], "tax": 0.5})
+    assert list(out) == [3.5, 8.5]
+
+    with pytest.raises(KeyError):
+        compiled.evaluate("total", {"price": 1})
+    with pytest.raises(ValueError):
+        compiled.evaluate("total", {"price": [1, 2], "quantity": [1, 2, 3], "tax": 0})
+
+
+def test_constant_and_single_name(results, tmp_path):
+    compiled = CBackend(cache_dir=str(tmp_path)).compile(results)
+
+    assert compiled.inputs["constant"] == []
+    assert compiled("constant") == 6
+    assert compiled.inputs["single"] == ["price"]
+    assert list(compiled.evaluate("single", {"price": [1, 2.5]})) == [1, 2.5]
+
+
+def test_single_result_is_named_base(parser, tmp_path):
+    compiled = CBackend(cache_dir=str(tmp_path)).compile(parser.parse("a / 2"))
+    assert compiled("base", a=3) == 1.5
+
+
+def test_missing_compiler(results, tmp_path):
+    backend = CBackend(cc="arithmetic-parsing-missing-cc", cache_dir=str(tmp_path))
+    with pytest.raises(CompileError):
+        backend.compile(results)
+
+
+def test_compiler_error(parser, tmp_path):
+    backend = CBackend(flags=["-arithmetic-parsing-bad-flag"], cache_dir=str(tmp_path))
+    with pytest.raises(CompileError):
+        backend.compile(parser.parse("a + b"))
+
+
+def test_invalid_name(parser, tmp_path):
+    with pytest.raises(ValueError):
+        CBackend(cache_dir=str(tmp_path)).emit({"not valid": parser.parse("a + b")})
+
+
+def test_assembly_emit(results):
+    asm = AssemblyBackend().emit(results).splitlines()
+
+    # Every formula gets a label, followed by its instructions
+    labels = [line for line in asm if line.endswith(":")]
+    assert labels == ["total:", "margin:", "constant:", "single:"]
+
+    single = asm[asm.index("single:") + 1:]
+    assert single == ["mov rax, [price] ; for single : price"]
+
+    constant = asm[asm.index("constant:") + 1:asm.index("single:")]
+    assert constant == ["mov rax, 2", "imul rax, 3"]
+
+    total = asm[asm.index("total:") + 1:asm.index("margin:")]
+    assert total[-1] == "add rax, [tax]"
+
+
+def test_assembly_folded_constant(parser):
+    # Constants that are folded to a value are moved straight into reg1
+    asm = AssemblyBackend(reg1="rcx").emit({"answer": parser.parse("42")})
+    assert asm.splitlines() == ["answer:", "mov rcx, 42 ; for answer : 42"]
+
+
+def test_get_backend():
+    assert isinstance(get_backend("assembly"), AssemblyBackend)
+    assert get_backend("c", cache_dir="/unused").cache_dir == "/unused"
+    with pytest.raises(KeyError):
+        get_backend("fortran")
+
+
+def test_backends_must_implement_emit():
+    from arithmetic_parsing.backends import Backend
+
+    class Incomplete(Backend):
+        name = "incomplete"
+
+    with pytest.raises(TypeError):
+        Incomplete()
+
+    class Text(Backend):
+        name = "text"
+
+        def emit(self, results):
+            return "\n".join(f"{name} = {result.infix}" for name, result in results.items())
+
+    assert Text().compile(Parser().parse("a + b")) == "base = a + b"
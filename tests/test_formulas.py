@@ -0,0 +1,102 @@
+import pytest
+
+from arithmetic_parsing import Parser
+from arithmetic_parsing.formulas import FormulaCycleError, compile_formulas
+
+
+@pytest.fixture
+def invoice():
+    return compile_formulas({
+        "subtotal": "price * quantity",
+        "tax": "subtotal * 2 / 10",
+        "total": "subtotal + tax",
+        "other": "quantity * price + 1",
+        "discount": "rate * 5",
+    })
+
+
+def test_evaluate(invoice):
+    assert invoice.inputs == {"price", "quantity", "rate"}
+    assert invoice.evaluate({"price": 10, "quantity": 3, "rate": 2}) == {
+        "subtotal": 30, "tax": 6, "total": 36, "other": 31, "discount": 10
+    }
+
+
+def test_order_and_dependencies(invoice):
+    order = invoice.order
+    assert order.index("subtotal") < order.index("tax") < order.index("total")
+    assert invoice.dependencies["total"] == {"subtotal", "tax"}
+    assert invoice.dependencies["other"] == set()
+
+
+def test_shared_subexpressions(invoice):
+    # price * quantity is computed once, for subtotal, tax, total and other
+    products = [expr for expr in invoice.schedule if expr[2] == "*" and set(expr[3:]) == {"price", "quantity"}]
+    assert len(products) == 1
+    assert invoice.results["subtotal"] == products[0][1]
+
+    # Every instruction is different
+    keys = [tuple(expr[2:]) for expr in invoice.schedule]
+    assert len(keys) == len(set(keys))
+    assert [expr[1] for expr in invoice.schedule] == [f"shared_{i}" for i in range(len(invoice.schedule))]
+
+
+def test_constant_and_single_name():
+    compiled = compile_formulas({"six": "2 * 3", "price_again": "price", "alias": "six"})
+    assert compiled.schedule == []
+    assert compiled.results == {"six": "6", "price_again": "price", "alias": "6"}
+    assert compiled.evaluate({"price": 4}) == {"six": 6, "price_again": 4, "alias": 6}
+
+
+def test_update_only_downstream(invoice):
+    invoice.evaluate({"price": 10, "quantity": 3, "rate": 2})
+
+    assert invoice.update({"rate": 3}) == {"discount": 15}
+    assert invoice.update({"quantity": 4}) == {"subtotal": 40, "tax": 8, "total": 48, "other": 41}
+    assert invoice.evaluate({"price": 10, "quantity": 4, "rate": 3})["total"] == 48
+
+    assert invoice.downstream(["subtotal"]) == ["subtotal", "tax", "total"]
+    assert invoice.downstream(["rate"]) == ["discount"]
+
+
+def test_update_errors(invoice):
+    with pytest.raises(RuntimeError):
+        invoice.update({"rate": 3})
+
+    invoice.evaluate({"price": 10, "quantity": 3, "rate": 2})
+    with pytest.raises(KeyError):
+        invoice.update({"total": 3})
+    with pytest.raises(KeyError):
+        invoice.evaluate({"price": 10})
+
+
+@pytest.mark.parametrize("formulas, cycle", [
+    ({"a": "a + 1"}, ["a", "a"]),
+    ({"a": "b * 2", "b": "c + a", "c": "1"}, ["a", "b", "a"]),
+    ({"x": "1", "a": "b", "b": "c", "c": "a"}, ["a", "b", "c", "a"]),
+])
+def test_cycles(formulas, cycle):
+    with pytest.raises(FormulaCycleError) as error:
+        compile_formulas(formulas)
+    assert error.value.cycle == cycle
+    assert isinstance(error.value, ValueError)
+
+
+def test_long_chain():
+    # Deeper than the recursion limit
+    formulas = {"f0": "x + 1"}
+    formulas.update({f"f{i}": f"f{i - 1} + 1" for i in range(1, 2000)})
+    assert compile_formulas(formulas).evaluate({"x": 0})["f1999"] == 2000
+
+
+@pytest.mark.parametrize("formulas", [
+    {"x": "shared_0 + y * 2"},
+    {"shared_1": "y * 2"},
+])
+def test_namespace_clash(formulas):
+    with pytest.raises(ValueError, match="shared_"):
+        compile_formulas(formulas)
+
+    # Another namespace works
+    compiled = compile_formulas(formulas, Parser(), namespace="sched")
+    assert compiled.schedule[0][1] == "sched_0"
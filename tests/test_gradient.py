@@ -0,0 +1,50 @@
+import pytest
+
+from arithmetic_parsing import Parser
+from arithmetic_parsing.gradient import differentiate
+
+
+@pytest.fixture
+def parser():
+    return Parser()
+
+
+@pytest.mark.parametrize("expr, values, value, derivatives", [
+    ("a * b + a / c", {"a": 2, "b": 3, "c": 4}, 6.5, {"a": 3.25, "b": 2, "c": -0.125}),
+    ("a - b - c", {"a": 1, "b": 2, "c": 3}, -4, {"a": 1, "b": -1, "c": -1}),
+    ("x * x * x", {"x": 2}, 8, {"x": 12}),
+    ("price", {"price": 5}, 5, {"price": 1}),
+    ("2 * 3", {}, 6, {}),
+])
+def test_derivatives(parser, expr, values, value, derivatives):
+    gradient = differentiate(parser.parse(expr), list(values))
+    assert gradient.evaluate(values) == (pytest.approx(value), pytest.approx(derivatives))
+
+
+def test_variables_not_in_the_expression(parser):
+    gradient = differentiate(parser.parse("a * 2"), ["a", "z"])
+    assert gradient.evaluate({"a": 1, "z": 5})[1] == {"a": 2, "z": 0}
+
+
+@pytest.mark.parametrize("expr, values, value, derivative", [
+    # Inputs named like the temporaries of older versions
+    ("grad_d0 * x", {"grad_d0": 3, "x": 2}, 6, 3),
+    ("grad_d1 * x + x", {"grad_d1": 3, "x": 2}, 8, 4),
+    ("grad_d0 * x + grad_d1 * grad_d2 * x", {"grad_d0": 1, "grad_d1": 2, "grad_d2": 3, "x": 2}, 14, 7),
+])
+def test_inputs_named_like_temporaries(parser, expr, values, value, derivative):
+    gradient = differentiate(parser.parse(expr), ["x"])
+    assert gradient.evaluate(values) == (value, {"x": derivative})
+
+
+@pytest.mark.parametrize("expr, variables", [
+    ("grad_0 * x", ["x"]),
+    ("x * 2", ["grad_3"]),
+    ("grad_1", ["x"]),
+])
+def test_namespace_clash(parser, expr, variables):
+    with pytest.raises(ValueError, match="grad_"):
+        differentiate(parser.parse(expr), variables)
+
+    # Another namespace works
+    differentiate(parser.parse(expr), variables, namespace="adjoint")
@@ -0,0 +1,79 @@
+import pytest
+
+from arithmetic_parsing import Parser, ParseResult
+from arithmetic_parsing.benchmarks.memory import DEFAULT_BUDGET, measure_retained, random_expressions
+
+
+@pytest.fixture
+def parser():
+    return Parser()
+
+
+def test_slots(parser):
+    result = parser.parse("a + b * 2")
+    assert not hasattr(result, "__dict__")
+    with pytest.raises(AttributeError):
+        result.something = 1
+
+
+def test_derived_fields_are_lazy(parser):
+    result = parser.parse("(a - b) * c")
+    assert result._prefix is None
+    assert result._postfix is None
+    assert result._tree is None
+
+    assert result.prefix == parser.infix_to_prefix("(a - b) * c")
+    assert result.postfix == parser.infix_to_postfix("(a - b) * c")
+    assert result.tree is result.tree
+    assert result._prefix is not None and result._postfix is not None
+
+
+def test_release(parser):
+    result = parser.parse("(a - b) * c")
+    prefix = result.prefix
+    result.postfix, result.tree
+
+    result.release()
+    assert result._prefix is None
+    assert result._postfix is None
+    assert result._tree is None
+
+    # The list is kept, and the rest is built again when used
+    assert result.as_list() == parser.parse("(a - b) * c").as_list()
+    assert result.prefix == prefix
+
+
+def test_names_are_shared(parser):
+    first = parser.parse("price * quantity")
+    second = parser.parse("quantity + price")
+    assert first.as_list()[0][3] is second.as_list()[0][4]
+
+
+def test_result_without_parser():
+    result = ParseResult()
+    result.tree_list = []
+    result.infix = "2 * x"
+
+    assert result.prefix == Parser().infix_to_prefix("2 * x")
+    assert result.postfix == Parser().infix_to_postfix("2 * x")
+    assert isinstance(result.parser, Parser)
+
+    single = ParseResult()
+    single.tree_list = []
+    single.infix = "price"
+    assert single.instructions() == ([], "price")
+
+
+def test_random_expressions_parse(parser):
+    # Seed 1 used to make a constant division by zero
+    expressions = random_expressions(1, 200, 4, parser)
+    assert len(expressions) == 200
+    for expr in expressions:
+        parser.parse(expr)
+    assert random_expressions(1, 200, 4, parser) == expressions
+
+
+def test_memory_budget():
+    # The same expressions as the command line defaults
+    expressions = random_expressions(0, 2000, 4)
+    assert measure_retained(expressions) <= DEFAULT_BUDGET
@@ -0,0 +1,118 @@
+import math
+
+import pytest
+
+from arithmetic_parsing import Parser, ranges
+from arithmetic_parsing.examples.assembly import listToAssembly, reg, register_widths
+
+
+@pytest.fixture
+def parser():
+    return Parser()
+
+
+def analyze(parser, expr, bounds, width=64):
+    return ranges.analyze(parser.parse(expr).as_list(), bounds, width)
+
+
+@pytest.mark.parametrize("op, a, b, expected", [
+    ("add", (1, 2), (10, 20), (11, 22)),
+    ("sub", (1, 2), (10, 20), (-19, -8)),
+    ("mul", (-2, 3), (4, 5), (-10, 15)),
+    ("mul", (0, 0), ranges.unbounded, (0, 0)),
+    ("div", (10, 20), (2, 5), (2, 10)),
+    ("div", (1, 2), (-1, 1), ranges.unbounded),
+])
+def test_interval_ops(op, a, b, expected):
+    assert getattr(ranges, op)(a, b) == expected
+
+
+def test_propagation(parser):
+    analysis = analyze(parser, "a * b + c - 4", {"a": (0, 10), "b": (-2, 3), "c": (1, 5)})
+    output = parser.parse("a * b + c - 4").as_list()[-1][1]
+
+    assert analysis.ranges["a"] == (0, 10)
+    assert analysis.ranges[output] == (-20 + 1 - 4, 30 + 5 - 4)
+    assert analysis.range_of("7") == (7, 7)
+    assert analysis.warnings == []
+
+
+def test_unbounded_inputs(parser):
+    analysis = analyze(parser, "a + 1", {})
+    assert analysis.ranges["a"] == ranges.unbounded
+    assert len(analysis.overflow) == 1
+    assert analysis.narrowest_width() is None
+
+
+def test_overflow(parser):
+    analysis = analyze(parser, "a * b", {"a": (0, 200), "b": (0, 200)}, width=8)
+    assert analysis.overflow == [parser.parse("a * b").as_list()[0][1]]
+    assert analysis.warnings == [f"{analysis.overflow[0]} might overflow 8 bits"]
+
+
+def test_division_by_zero_is_not_also_overflow(parser):
+    analysis = analyze(parser, "a / b + 1", {"a": (0, 10), "b": (-1, 1)})
+    division = parser.parse("a / b + 1").as_list()[0][1]
+
+    assert analysis.division_by_zero == [division]
+    assert analysis.ranges[division] == ranges.unbounded
+    # Neither the division nor what uses it is reported as an overflow
+    assert analysis.overflow == []
+    assert analysis.warnings == [f"{division} might divide by zero"]
+
+
+def test_constant_zero_divisor(parser):
+    analysis = analyze(parser, "a / 0", {"a": (0, 10)})
+    assert len(analysis.division_by_zero) == 1
+    assert analysis.overflow == []
+
+
+def test_narrowest_width(parser):
+    analysis = analyze(parser, "a + b", {"a": (0, 100), "b": (0, 100)})
+    assert analysis.narrowest_width() == 16
+    assert analysis.narrowest_width(["a", "b"]) == 8
+    assert analysis.narrowest_width(["2147483648"]) == 64
+    assert math.isinf(ranges.unbounded[1])
+
+
+def assembly(parser, expr, bounds, **registers):
+    tree_list = parser.parse(expr).as_list()
+    analysis = ranges.analyze(tree_list, bounds)
+    return listToAssembly([row[:] for row in tree_list], expr, ranges=analysis, **registers)
+
+
+def test_register_widths(parser):
+    small = {"a": (0, 10), "b": (0, 10), "c": (0, 10)}
+    assert assembly(parser, "a + b", small) == ["mov al, [a]", "add al, [b]"]
+    assert assembly(parser, "a + b", {"a": (0, 1000), "b": (0, 10)}) == ["mov ax, [a]", "add ax, [b]"]
+    assert assembly(parser, "a + b", {}) == ["mov rax, [a]", "add rax, [b]"]
+
+
+@pytest.mark.parametrize("expr", ["a * b", "a - b / c"])
+def test_no_8_bit_multiply_or_divide(parser, expr):
+    asm = assembly(parser, expr, {"a": (0, 10), "b": (0, 10), "c": (1, 10)})
+    assert all(line.split(",")[0].split()[-1] in ["ax", "bx"] for line in asm)
+
+
+def test_register_tables_agree(parser):
+    for names in register_widths.values():
+        for name in names.values():
+            assert name in reg
+
+    asm = assembly(parser, "(a + b) - (a + c)", {"a": (0, 10), "b": (0, 10), "c": (0, 10)}, reg1="rsi", reg2="rdi")
+    # Registers are never read as memory
+    assert all("[sil]" not in line and "[dil]" not in line for line in asm)
+    assert any("sil" in line for line in asm) and any("dil" in line for line in asm)
+
+
+def test_division_checks(parser):
+    # The divisor can not be zero, so there is no check
+    assert not any("divide_by_zero" in line for line in assembly(parser, "a / b", {"a": (0, 10), "b": (1, 10)}))
+
+    # The quotient is unbounded, so this uses 64 bits
+    checked = assembly(parser, "a / b", {"a": (0, 10), "b": (-1, 10)})
+    assert "cmp qword [b], 0" in checked
+    assert "je base_divide_by_zero" in checked
+
+    # A constant zero always jumps
+    assert "jmp base_divide_by_zero" in assembly(parser, "a / 0", {"a": (0, 10)})
@@ -0,0 +1,35 @@
+import subprocess
+import sys
+import os
+
+import pytest
+
+from arithmetic_parsing.benchmarks.startup import LAZY_MODULES, check_budget
+
+
+# The repository root, so fresh interpreters import this checkout
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture(autouse=True)
+def pythonpath(monkeypatch):
+    monkeypatch.setenv("PYTHONPATH", os.pathsep.join(filter(None, [root, os.environ.get("PYTHONPATH")])))
+
+
+def test_lazy_modules_not_imported():
+    code = "import sys, arithmetic_parsing; print(' '.join(sorted(sys.modules)))"
+    proc = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    imported = set(proc.stdout.split())
+
+    assert "arithmetic_parsing" in imported
+    assert [module for module in LAZY_MODULES if module in imported] == []
+
+
+def test_lazy_modules_load_on_access():
+    code = "import sys, arithmetic_parsing; arithmetic_parsing.examples.assembly; print('treelib' in sys.modules)"
+    proc = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    assert proc.stdout.strip() == "False"
+
+
+def test_import_budget():
+    assert check_budget(runs=3) == []